@@ -0,0 +1,99 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+import numpy as np
+import pandas as pd
+import placement_backends
+from jit_kernels import HAVE_NUMBA
+from units import container_to_mm, item_to_mm
+from zone_parallel import pack_items
+
+
+# ---------- Placement Benchmark ----------
+# Times the geometric part of placement (no fit model) on input_items.csv /
+# containers.csv for the chosen engines. Usage:
+#   python benchmark_placement.py --items 300 --engines grid_jit extreme_points
+# "grid_jit" is run twice: once compiled and once with NUMBA_DISABLE_JIT=1
+# (same kernels as plain Python) to show the JIT speedup.
+
+def load_items(path="input_items.csv"):
+    items = []
+    for row in pd.read_csv(path, dtype={"item_id": str}).to_dict(orient="records"):
+        items.append(item_to_mm({
+            "itemId": row["item_id"],
+            "name": row["name"],
+            "width": float(row["width_cm"]),
+            "depth": float(row["depth_cm"]),
+            "height": float(row["height_cm"]),
+            "priority": int(row["priority"]),
+            "preferredZone": row["preferred_zone"]
+        }))
+    return items
+
+
+def load_containers(path="containers.csv"):
+    containers = []
+    for row in pd.read_csv(path).to_dict(orient="records"):
+        containers.append(container_to_mm({
+            "containerId": row["container_id"],
+            "zone": row["zone"],
+            "width": float(row["width_cm"]),
+            "depth": float(row["depth_cm"]),
+            "height": float(row["height_cm"])
+        }))
+    return containers
+
+
+class AcceptAll:
+    # Stands in for the fit model: the geometric cascade of FitMatrix
+    # rejects the pairs that cannot fit, and every pair it leaves fits in
+    # some rotation
+    def scores(self, rows):
+        return np.ones(len(rows))
+
+
+def run_placement(items, containers, engine):
+    # The real placement loop (zone_parallel.pack_items), without stamping
+    items_sorted = sorted(items, key=placement_backends.placement_order(engine))
+    placed, _, _ = pack_items(
+        items_sorted, containers, engine, placement_backends.POSITION_SEARCH[engine], AcceptAll()
+    )
+    return len(placed)
+
+
+def time_engine(items, containers, engine):
+    if engine == "grid_jit":
+        # Compile outside the timed run
+        run_placement(items[:1], containers[:1], engine)
+    start = time.perf_counter()
+    placed = run_placement(items, containers, engine)
+    return placed, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=300, help="number of items from input_items.csv")
+    parser.add_argument("--engines", nargs="+", default=["grid_jit", "extreme_points"])
+    parser.add_argument("--no-python-baseline", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    items = load_items()[:args.items]
+    containers = load_containers()
+    print(f"{len(items)} items, {len(containers)} containers, numba={'yes' if HAVE_NUMBA else 'no'}")
+
+    for engine in args.engines:
+        placed, seconds = time_engine(items, containers, engine)
+        label = engine if engine != "grid_jit" or HAVE_NUMBA else "grid_jit (python fallback)"
+        if os.environ.get("NUMBA_DISABLE_JIT") == "1":
+            label = f"{engine} (NUMBA_DISABLE_JIT=1)"
+        print(f"{label:36s} placed {placed:5d}  {seconds:8.2f} s")
+
+    if "grid_jit" in args.engines and HAVE_NUMBA and not args.no_python_baseline:
+        subprocess.run(
+            [sys.executable, __file__, "--items", str(args.items),
+             "--engines", "grid_jit", "--no-python-baseline"],
+            env={**os.environ, "NUMBA_DISABLE_JIT": "1"},
+            check=True,
+        )
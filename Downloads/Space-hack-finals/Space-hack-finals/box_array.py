@@ -0,0 +1,106 @@
+from shape_memo import rotate_item
+import numpy as np
+from units import COORD_DTYPE, to_mm
+
+
+# ---------- Struct-of-Arrays Box Storage ----------
+# Placed boxes of a container live in one contiguous (N, 6) int32 array laid
+# out as x0, y0, z0, x1, y1, z1, grown by doubling. overlaps_any() tests a
+# whole batch of candidate boxes against every placed box in one call, so
+# the per-pair Python overhead of overlaps() goes away.
+#
+# Like SpatialHashIndex it stands in for the list kept in
+# used_space[containerId] (append / remove / iteration / len).
+
+INITIAL_CAPACITY = 16
+# Candidates tested per kernel call; bounds the (chunk, N) temporaries
+CHUNK_SIZE = 4096
+LATTICE_STEP = to_mm(5)
+
+
+def overlaps_any(candidates, placed):
+    # candidates: (M, 6), placed: (N, 6) -> (M,) bool, True if the candidate
+    # overlaps at least one placed box. Touching faces do not count.
+    if len(placed) == 0:
+        return np.zeros(len(candidates), dtype=bool)
+    c = candidates[:, None, :]
+    p = placed[None, :, :]
+    hit = (
+        (c[..., 3] > p[..., 0]) & (c[..., 0] < p[..., 3]) &
+        (c[..., 4] > p[..., 1]) & (c[..., 1] < p[..., 4]) &
+        (c[..., 5] > p[..., 2]) & (c[..., 2] < p[..., 5])
+    )
+    return hit.any(axis=1)
+
+
+class BoxArray:
+    def __init__(self, container=None, capacity=INITIAL_CAPACITY):
+        self._data = np.empty((capacity, 6), dtype=COORD_DTYPE)
+        self._size = 0
+
+    @property
+    def array(self):
+        return self._data[:self._size]
+
+    def append(self, box):
+        if self._size == len(self._data):
+            grown = np.empty((2 * len(self._data), 6), dtype=COORD_DTYPE)
+            grown[:self._size] = self._data[:self._size]
+            self._data = grown
+        start, end = box
+        self._data[self._size] = (*start, *end)
+        self._size += 1
+
+    def remove(self, box):
+        row = np.array((*box[0], *box[1]), dtype=COORD_DTYPE)
+        matches = np.flatnonzero((self.array == row).all(axis=1))
+        if not matches.size:
+            raise ValueError(f"{box} is not in the array")
+        i = matches[0]
+        # Keep insertion order so iteration matches the old list
+        self._data[i:self._size - 1] = self._data[i + 1:self._size]
+        self._size -= 1
+
+    def intersects(self, box):
+        row = np.array([[*box[0], *box[1]]], dtype=COORD_DTYPE)
+        return bool(overlaps_any(row, self.array)[0])
+
+    def first_free(self, candidates):
+        # Index of the first candidate that collides with nothing, or None
+        placed = self.array
+        for offset in range(0, len(candidates), CHUNK_SIZE):
+            chunk = candidates[offset:offset + CHUNK_SIZE]
+            free = np.flatnonzero(~overlaps_any(chunk, placed))
+            if free.size:
+                return offset + int(free[0])
+        return None
+
+    def __iter__(self):
+        return (
+            (tuple(row[:3].tolist()), tuple(row[3:].tolist()))
+            for row in self.array
+        )
+
+    def __len__(self):
+        return self._size
+
+
+def find_lattice_position(container, used_positions, item, step=LATTICE_STEP):
+    # The 5 cm lattice scan of find_free_position, with every lattice point
+    # of a rotation tested in batches instead of one by one
+    for rotation in rotate_item(item):
+        w, d, h = rotation
+        xs = np.arange(0, container['width'] - w + 1, step, dtype=COORD_DTYPE)
+        ys = np.arange(0, container['depth'] - d + 1, step, dtype=COORD_DTYPE)
+        zs = np.arange(0, container['height'] - h + 1, step, dtype=COORD_DTYPE)
+        if not (xs.size and ys.size and zs.size):
+            continue
+        # indexing="ij" keeps the scan order: width, then depth, then height
+        gx, gy, gz = np.meshgrid(xs, ys, zs, indexing="ij")
+        starts = np.stack([gx.ravel(), gy.ravel(), gz.ravel()], axis=1)
+        candidates = np.hstack([starts, starts + (w, d, h)])
+        i = used_positions.first_free(candidates)
+        if i is not None:
+            x, y, z = starts[i].tolist()
+            return ((x, y, z), (x + w, y + d, z + h))
+    return None
@@ -0,0 +1,79 @@
+import argparse
+import random
+import placement_backends
+from units import to_mm
+
+
+# ---------- Remove vs Rebuild Check ----------
+# Rearrangement takes boxes out of the used_space structures with remove()
+# instead of rebuilding them. This fills random containers through each
+# engine's own search, removes random boxes, and checks the structure
+# against one rebuilt from the remaining boxes: the maximal spaces must be
+# the same set, and every probe item must get the same position from both.
+#
+#   python check_remove.py --trials 50 --engines maximal_spaces voxel
+#
+# extreme_points stands for the engines on a plain SpatialHashIndex. The
+# shelf backend is left out: removing a box only gives space back at
+# the end of a shelf, by design.
+
+CHECKED = sorted(set(placement_backends.USED_SPACE) - {"shelf"} | {"extreme_points"})
+
+
+def random_item(rng, n):
+    return {
+        "itemId": f"item-{n}",
+        "width": to_mm(rng.randint(5, 40)),
+        "depth": to_mm(rng.randint(5, 40)),
+        "height": to_mm(rng.randint(5, 40)),
+    }
+
+
+def rebuilt(engine, container, boxes):
+    used = placement_backends.new_used_space(engine, container)
+    for box in boxes:
+        used.append(box)
+    return used
+
+
+def check(engine, trials, seed=0):
+    rng = random.Random(seed)
+    find_position = placement_backends.POSITION_SEARCH[engine]
+    mismatches = 0
+    for trial in range(trials):
+        container = {
+            "containerId": f"check-{trial}",
+            "width": to_mm(rng.randint(40, 120)),
+            "depth": to_mm(rng.randint(40, 120)),
+            "height": to_mm(rng.randint(40, 120)),
+        }
+        used = placement_backends.new_used_space(engine, container)
+        boxes = []
+        for n in range(rng.randint(5, 40)):
+            box = find_position(container, used, random_item(rng, n))
+            if box:
+                used.append(box)
+                boxes.append(box)
+        for box in rng.sample(boxes, len(boxes) // 2):
+            used.remove(box)
+            boxes.remove(box)
+
+        fresh = rebuilt(engine, container, boxes)
+        spaces = getattr(used, "spaces", None)
+        if spaces is not None and set(spaces) != set(fresh.spaces):
+            mismatches += 1
+            continue
+        probes = [random_item(rng, f"probe-{n}") for n in range(10)]
+        if any(find_position(container, used, p) != find_position(container, fresh, p) for p in probes):
+            mismatches += 1
+    return mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trials", type=int, default=50, help="random containers per engine")
+    parser.add_argument("--engines", nargs="+", default=CHECKED, choices=CHECKED)
+    args = parser.parse_args()
+
+    for engine in args.engines:
+        print(f"{engine:24s} {check(engine, args.trials)} mismatches in {args.trials} containers")
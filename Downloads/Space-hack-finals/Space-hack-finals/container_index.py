@@ -0,0 +1,193 @@
+import heapq
+from collections import defaultdict
+from shape_memo import sorted_dims
+
+
+# ---------- Container Selection Index ----------
+# Keeps a capacity summary per container (remaining volume and the largest
+# free extent along each axis) and groups containers by zone, each zone in a
+# CapacityTree over its original container order. candidates(item) only
+# yields containers that could still hold the item: preferred zone first,
+# then every other zone, each in the original container order. Containers
+# that are too full or too small are skipped without running the model or a
+# position search.
+#
+# candidates() is a generator. Each container is found only when the
+# caller asks for the next one, so a loop that stops at the first container
+# taking the item never looks at the rest, and finding the next one is a
+# tree descent rather than a walk over every container. The other zones are
+# merged by original position.
+#
+# With learn_failures, a container also remembers the sorted dimensions of
+# items whose position search failed there. Boxes are only added during a
+# run, so free space only shrinks, and any item at least as large on every
+# sorted axis is ruled out without searching again. This only holds for
+# searches where a box that fits implies every smaller box fits at the same
+# spot (see placement_backends.MONOTONE_SEARCH).
+
+def box_volume(box):
+    start, end = box
+    return (end[0] - start[0]) * (end[1] - start[1]) * (end[2] - start[2])
+
+
+def dominates(small, large):
+    return all(s <= l for s, l in zip(small, large))
+
+
+class CapacityTree:
+    # Max segment tree over one zone's containers. A leaf holds a
+    # container's capacity (remaining volume, then its sorted free extents)
+    # and every node the per-component maximum below it, so a subtree whose
+    # maxima cannot cover a shape is skipped whole.
+    def __init__(self, capacities):
+        self.n = len(capacities)
+        self.size = 1
+        while self.size < self.n:
+            self.size *= 2
+        self.nodes = [(0, 0, 0, 0)] * (2 * self.size)
+        self.nodes[self.size:self.size + self.n] = capacities
+        for node in range(self.size - 1, 0, -1):
+            self.nodes[node] = tuple(map(max, self.nodes[2 * node], self.nodes[2 * node + 1]))
+
+    def top(self):
+        return self.nodes[1]
+
+    def set(self, position, capacity):
+        node = position + self.size
+        self.nodes[node] = capacity
+        node //= 2
+        while node:
+            self.nodes[node] = tuple(map(max, self.nodes[2 * node], self.nodes[2 * node + 1]))
+            node //= 2
+
+    def first(self, start, need):
+        # The first position from `start` whose capacity covers `need`, or None
+        return self._first(1, 0, self.size, start, need)
+
+    def _first(self, node, low, high, start, need):
+        if high <= start or low >= self.n or not dominates(need, self.nodes[node]):
+            return None
+        if high - low == 1:
+            return low
+        middle = (low + high) // 2
+        found = self._first(2 * node, low, middle, start, need)
+        if found is None:
+            found = self._first(2 * node + 1, middle, high, start, need)
+        return found
+
+
+class ContainerIndex:
+    def __init__(self, containers, learn_failures=False):
+        self.learn_failures = learn_failures
+        self.failed = defaultdict(list)
+        self.order = {}
+        self.zone_of = {}
+        self.remaining = {}
+        self.extents = {}
+        self.sorted_extents = {}
+        self.free_volume = 0
+        # Container ids per zone in their original order, and each
+        # container's position there
+        self.zone_ids = defaultdict(list)
+        self.slot = {}
+        for position, container in enumerate(containers):
+            cid = container['containerId']
+            self.order[cid] = position
+            self.zone_of[cid] = container['zone']
+            self.remaining[cid] = container['width'] * container['depth'] * container['height']
+            self.free_volume += self.remaining[cid]
+            self.extents[cid] = (container['width'], container['depth'], container['height'])
+            self.sorted_extents[cid] = tuple(sorted(self.extents[cid]))
+            self.slot[cid] = len(self.zone_ids[container['zone']])
+            self.zone_ids[container['zone']].append(cid)
+        self.trees = {
+            zone: CapacityTree([self._capacity(cid) for cid in ids])
+            for zone, ids in self.zone_ids.items()
+        }
+
+    def _capacity(self, cid):
+        return (self.remaining[cid], *self.sorted_extents[cid])
+
+    def _holds(self, cid, dims, volume):
+        return (
+            volume <= self.remaining[cid] and
+            dominates(dims, self.sorted_extents[cid]) and
+            not self.ruled_out(cid, dims)
+        )
+
+    def can_hold(self, cid, item):
+        dims = sorted_dims(item)
+        return self._holds(cid, dims, dims[0] * dims[1] * dims[2])
+
+    def ruled_out(self, cid, dims):
+        return any(dominates(failed, dims) for failed in self.failed[cid])
+
+    def _zone_candidates(self, zone, dims, volume):
+        # The zone's containers that could hold the shape, in order. The
+        # tree only knows capacities; failures learned are checked per hit.
+        tree = self.trees.get(zone)
+        if tree is None:
+            return
+        need = (volume, *dims)
+        position = tree.first(0, need)
+        while position is not None:
+            cid = self.zone_ids[zone][position]
+            if self._holds(cid, dims, volume):
+                yield cid
+            position = tree.first(position + 1, need)
+
+    def candidates(self, item, skip_preferred=False):
+        # With skip_preferred, the item's own zone is left out
+        dims = sorted_dims(item)
+        volume = dims[0] * dims[1] * dims[2]
+        preferred = item['preferredZone']
+        if not skip_preferred:
+            yield from self._zone_candidates(preferred, dims, volume)
+        others = [
+            ((self.order[cid], cid) for cid in self._zone_candidates(zone, dims, volume))
+            for zone, tree in self.trees.items()
+            if zone != preferred and tree.top()[0] >= volume
+        ]
+        for _, cid in heapq.merge(*others):
+            yield cid
+
+    def _set_remaining(self, cid, remaining):
+        self.free_volume += remaining - self.remaining[cid]
+        self.remaining[cid] = remaining
+
+    def _update_extents(self, cid, used_positions):
+        # Free-space trackers know the real largest free extents; for the
+        # other structures the container size stays a valid upper bound
+        spaces = getattr(used_positions, 'spaces', None)
+        if spaces is not None:
+            self.extents[cid] = tuple(
+                max((end[axis] - start[axis] for start, end in spaces), default=0)
+                for axis in range(3)
+            )
+            self.sorted_extents[cid] = tuple(sorted(self.extents[cid]))
+        self.trees[self.zone_of[cid]].set(self.slot[cid], self._capacity(cid))
+
+    def record(self, cid, box, used_positions=None):
+        # Called after a box is placed in container `cid`
+        self._set_remaining(cid, self.remaining[cid] - box_volume(box))
+        self._update_extents(cid, used_positions)
+
+    def release(self, cid, box, used_positions=None):
+        # Called after a box is taken out of container `cid`. Free space
+        # grew, so failures learned there no longer hold.
+        self._set_remaining(cid, self.remaining[cid] + box_volume(box))
+        self._update_extents(cid, used_positions)
+        self.failed.pop(cid, None)
+
+    def record_failure(self, cid, item):
+        # Called when a position search for `item` in `cid` found nothing.
+        # Only the smallest failed shapes are kept.
+        if not self.learn_failures:
+            return
+        dims = sorted_dims(item)
+        if self.ruled_out(cid, dims):
+            return
+        self.failed[cid] = [f for f in self.failed[cid] if not dominates(dims, f)] + [dims]
+
+    def max_remaining(self):
+        return max((tree.top()[0] for tree in self.trees.values()), default=0)
@@ -0,0 +1,65 @@
+from shape_memo import rotate_item
+import numpy as np
+from box_array import BoxArray
+from spatial_index import collides
+
+
+# ---------- Extreme-Point Position Search ----------
+# Instead of scanning every x/y/z on a 5 cm lattice, only the "extreme points"
+# created by boxes already in the container are tried: the origin plus, for
+# every placed box, the three corners sitting on its +width, +depth and
+# +height faces. Boxes use the same (start, end) contract as find_free_position.
+
+def extreme_points(used_positions):
+    points = {(0, 0, 0)}
+    for start, end in used_positions:
+        points.add((end[0], start[1], start[2]))
+        points.add((start[0], end[1], start[2]))
+        points.add((start[0], start[1], end[2]))
+    # Same order as the lattice scan: width first, then depth, then height
+    return sorted(points)
+
+
+def find_extreme_point_position(container, used_positions, item):
+    if isinstance(used_positions, BoxArray):
+        return find_extreme_point_position_batched(container, used_positions, item)
+    points = extreme_points(used_positions)
+    container_w = container['width']
+    container_d = container['depth']
+    container_h = container['height']
+
+    for rotation in rotate_item(item):
+        w, d, h = rotation
+        for x, y, z in points:
+            if x + w > container_w or y + d > container_d or z + h > container_h:
+                continue
+            box = ((x, y, z), (x + w, y + d, z + h))
+            if collides(used_positions, box):
+                continue
+            return box
+    return None
+
+
+def find_extreme_point_position_batched(container, used_positions, item):
+    # Same search, but all points of a rotation go through one
+    # BoxArray.first_free call
+    placed = used_positions.array
+    points = np.unique(np.vstack([
+        np.zeros((1, 3), dtype=placed.dtype),
+        np.column_stack([placed[:, 3], placed[:, 1], placed[:, 2]]),
+        np.column_stack([placed[:, 0], placed[:, 4], placed[:, 2]]),
+        np.column_stack([placed[:, 0], placed[:, 1], placed[:, 5]]),
+    ]), axis=0)
+    limits = np.array([container['width'], container['depth'], container['height']])
+
+    for rotation in rotate_item(item):
+        dims = np.array(rotation, dtype=placed.dtype)
+        starts = points[(points + dims <= limits).all(axis=1)]
+        if not len(starts):
+            continue
+        i = used_positions.first_free(np.hstack([starts, starts + dims]))
+        if i is not None:
+            x, y, z = starts[i].tolist()
+            w, d, h = rotation
+            return ((x, y, z), (x + w, y + d, z + h))
+    return None
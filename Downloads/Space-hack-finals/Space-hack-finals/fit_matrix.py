@@ -0,0 +1,132 @@
+import threading
+from collections import Counter
+from functools import lru_cache
+import numpy as np
+from units import MM_PER_CM
+
+
+# ---------- Batched Fit Matrix ----------
+# The fit model only sees the item's dimensions and priority and the
+# container's dimensions, and none of those change during a run. So every
+# (item, container) answer is known before placement starts. FitMatrix asks
+# the model once per run: each distinct item row is paired with each
+# distinct container shape, the pairs geometry cannot settle (see the
+# cascade below) are sent through one transform and one predict call, and
+# the answers are spread back over the full item x container matrix. The
+# placement loop then only reads the matrix.
+#
+# Features are in centimetres, in the column order the models were trained
+# on: item width, depth, height, priority, container width, depth, height.
+# Items and containers are dicts in integer millimetres.
+
+def item_columns(items):
+    rows = np.array(
+        [(item['width'], item['depth'], item['height'], item['priority']) for item in items],
+        dtype=float,
+    ).reshape(-1, 4)
+    rows[:, :3] /= MM_PER_CM
+    return rows
+
+
+@lru_cache(maxsize=64)
+def _container_columns(shapes):
+    columns = np.array(shapes, dtype=float).reshape(-1, 3) / MM_PER_CM
+    columns.flags.writeable = False
+    return columns
+
+
+def container_columns(containers):
+    # Cached: most requests are planned against the same set of containers
+    return _container_columns(tuple((c['width'], c['depth'], c['height']) for c in containers))
+
+
+def batch_scores(fits, rows):
+    # Models with a batched scores() are called once; any other callable
+    # is asked row by row
+    if hasattr(fits, "scores"):
+        return np.asarray(fits.scores(rows))
+    return np.array([fits(tuple(row)) for row in rows])
+
+
+# ---------- Geometric Cascade ----------
+# Most pairs never need the model. Before asking it, each distinct
+# (item row, container shape) pair goes through exact checks on sorted
+# dimensions, all vectorized:
+#   - "rejected": some sorted item side exceeds the matching container
+#     side, so no rotation fits
+#   - "accepted": the item's longest side fits the container's shortest
+#     side, so every rotation fits
+#   - "model": only the rest, which fit in some rotations but not all
+# Capacity is not known here: ContainerIndex.candidates() already skips
+# containers whose remaining volume or free extents are too small before
+# the matrix is read. Scores of pairs decided by geometry are 1.0 or 0.0.
+# With cascade=False every pair goes to the model, for measuring the model
+# itself (model_bakeoff.py) or making sure it is called (warmup).
+#
+# Every FitMatrix adds its counts (item x container pairs per stage, and
+# the rows actually sent to the model) to the process-wide totals in
+# cascade_stats().
+
+CASCADE_STAGES = ("rejected", "accepted", "model")
+_cascade_totals = Counter()
+_cascade_lock = threading.Lock()
+
+
+def cascade_stats():
+    with _cascade_lock:
+        totals = {stage: _cascade_totals[stage] for stage in CASCADE_STAGES}
+        totals["modelRows"] = _cascade_totals["modelRows"]
+    return totals
+
+
+class FitMatrix:
+    def __init__(self, items, containers, fits, threshold=None, cascade=True):
+        # threshold: accept scores at or above it; defaults to the fit
+        # model's own threshold, or truthiness for plain callables
+        self.rows = {item['itemId']: i for i, item in enumerate(items)}
+        self.cols = {c['containerId']: j for j, c in enumerate(containers)}
+        if threshold is None:
+            threshold = getattr(fits, "threshold", None)
+
+        item_rows, item_of = np.unique(item_columns(items), axis=0, return_inverse=True)
+        shape_rows, shape_of = np.unique(container_columns(containers), axis=0, return_inverse=True)
+        item_of, shape_of = item_of.ravel(), shape_of.ravel()
+
+        item_sides = np.sort(item_rows[:, :3], axis=1)
+        shape_sides = np.sort(shape_rows, axis=1)
+        some_rotation = (item_sides[:, None, :] <= shape_sides[None, :, :]).all(axis=2)
+        every_rotation = item_sides[:, None, 2] <= shape_sides[None, :, 0]
+        if not cascade:
+            some_rotation = np.ones_like(some_rotation)
+            every_rotation = np.zeros_like(every_rotation)
+        ambiguous = some_rotation & ~every_rotation
+
+        scores = every_rotation.astype(float)
+        feasible = every_rotation.copy()
+        asked_items, asked_shapes = np.nonzero(ambiguous)
+        if len(asked_items):
+            pairs = np.hstack([item_rows[asked_items], shape_rows[asked_shapes]])
+            answers = np.asarray(batch_scores(fits, pairs), dtype=float)
+            scores[ambiguous] = answers
+            feasible[ambiguous] = answers.astype(bool) if threshold is None else answers >= threshold
+        self.scores = scores[np.ix_(item_of, shape_of)]
+        self.feasible = feasible[np.ix_(item_of, shape_of)]
+
+        # Stage counts over the full item x container matrix
+        weight = np.outer(np.bincount(item_of, minlength=len(item_rows)),
+                          np.bincount(shape_of, minlength=len(shape_rows)))
+        self.stages = {
+            "rejected": int(weight[~some_rotation].sum()),
+            "accepted": int(weight[every_rotation].sum()),
+            "model": int(weight[ambiguous].sum()),
+        }
+        self.model_rows = len(asked_items)
+        with _cascade_lock:
+            _cascade_totals.update(self.stages)
+            _cascade_totals["modelRows"] += self.model_rows
+
+    def score(self, item, container):
+        return self.scores[self.rows[item['itemId']], self.cols[container['containerId']]]
+
+    def fits(self, item, container):
+        return bool(self.feasible[self.rows[item['itemId']], self.cols[container['containerId']]])
@@ -0,0 +1,143 @@
+from shape_memo import rotate_item
+from spatial_index import overlaps
+
+
+# ---------- Empty Maximal Spaces ----------
+# Free space in a container is kept as the list of maximal empty cuboids
+# (spaces that cannot grow along any axis without hitting a box or a wall).
+# Inserting a box splits every space it cuts into at most six remainders;
+# removing a box merges the freed region back with the spaces around it.
+# In a crowded container those merges can multiply, so past MERGE_LIMIT
+# candidate spaces the list is rebuilt from the remaining boxes instead.
+# Candidate positions for an item are the corners of the spaces it fits in.
+#
+# Like SpatialHashIndex it stands in for the list kept in
+# used_space[containerId] (append / remove / iteration / len).
+
+# Candidate spaces a removal may explore, per space already kept
+MERGE_LIMIT = 4
+
+
+def contains(outer, inner):
+    (o_start, o_end), (i_start, i_end) = outer, inner
+    return (
+        o_start[0] <= i_start[0] and i_end[0] <= o_end[0] and
+        o_start[1] <= i_start[1] and i_end[1] <= o_end[1] and
+        o_start[2] <= i_start[2] and i_end[2] <= o_end[2]
+    )
+
+
+def split_space(space, box):
+    # Parts of `space` left free after `box` is placed; they may overlap
+    start, end = space
+    b_start, b_end = box
+    parts = []
+    for axis in range(3):
+        if b_start[axis] > start[axis]:
+            new_end = list(end)
+            new_end[axis] = b_start[axis]
+            parts.append((start, tuple(new_end)))
+        if b_end[axis] < end[axis]:
+            new_start = list(start)
+            new_start[axis] = b_end[axis]
+            parts.append((tuple(new_start), end))
+    return parts
+
+
+def merge_spaces(a, b):
+    # Cuboids spanning both spaces along one axis, over the cross-section
+    # the two share on the other two axes
+    merged = []
+    for axis in range(3):
+        if a[1][axis] < b[0][axis] or b[1][axis] < a[0][axis]:
+            continue
+        start, end = [0, 0, 0], [0, 0, 0]
+        for other in range(3):
+            if other == axis:
+                start[other] = min(a[0][other], b[0][other])
+                end[other] = max(a[1][other], b[1][other])
+            else:
+                start[other] = max(a[0][other], b[0][other])
+                end[other] = min(a[1][other], b[1][other])
+        if all(start[i] < end[i] for i in range(3)):
+            merged.append((tuple(start), tuple(end)))
+    return merged
+
+
+def keep_maximal(spaces):
+    # Drop duplicates and spaces contained in another one
+    spaces = sorted(set(spaces), key=lambda s: -volume(s))
+    maximal = []
+    for space in spaces:
+        if not any(contains(other, space) for other in maximal):
+            maximal.append(space)
+    return maximal
+
+
+def volume(space):
+    start, end = space
+    return (end[0] - start[0]) * (end[1] - start[1]) * (end[2] - start[2])
+
+
+class MaximalSpaceTracker:
+    def __init__(self, container):
+        self.bounds = ((0, 0, 0), (container['width'], container['depth'], container['height']))
+        self.spaces = [self.bounds]
+        self.boxes = []
+
+    def append(self, box):
+        self.boxes.append(box)
+        kept, cut = [], []
+        for space in self.spaces:
+            if overlaps(space, box):
+                cut.extend(split_space(space, box))
+            else:
+                kept.append(space)
+        # Only the new pieces can be redundant; untouched spaces were
+        # already maximal
+        cut = [s for s in keep_maximal(cut) if not any(contains(k, s) for k in kept)]
+        self.spaces = kept + cut
+
+    def remove(self, box):
+        self.boxes.remove(box)
+        # Every new maximal space overlaps the freed box, so only merges
+        # involving a space that reaches into it are explored
+        frontier = [box]
+        found = set(self.spaces) | {box}
+        limit = MERGE_LIMIT * len(found)
+        while frontier:
+            if len(found) > limit:
+                self.rebuild()
+                return
+            current = frontier.pop()
+            for other in list(found):
+                for merged in merge_spaces(current, other):
+                    if merged not in found and overlaps(merged, box):
+                        found.add(merged)
+                        frontier.append(merged)
+        self.spaces = keep_maximal(found)
+
+    def rebuild(self):
+        boxes = self.boxes
+        self.spaces = [self.bounds]
+        self.boxes = []
+        for other in boxes:
+            self.append(other)
+
+    def __iter__(self):
+        return iter(self.boxes)
+
+    def __len__(self):
+        return len(self.boxes)
+
+
+def find_maximal_space_position(container, used_positions, item):
+    spaces = sorted(used_positions.spaces, key=lambda s: s[0])
+    for rotation in rotate_item(item):
+        w, d, h = rotation
+        for start, end in spaces:
+            if (end[0] - start[0] >= w and end[1] - start[1] >= d
+                    and end[2] - start[2] >= h):
+                x, y, z = start
+                return ((x, y, z), (x + w, y + d, z + h))
+    return None
@@ -0,0 +1,90 @@
+from shape_memo import rotate_item
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from units import COORD_DTYPE, to_mm
+
+
+# ---------- Heightmap Gravity Packing ----------
+# Each container keeps a 2D (width, depth) array with the height of the top
+# surface in every cell. An item is dropped onto its footprint and comes to
+# rest on the highest cell underneath it, so only x/y are searched. A
+# position is only accepted if enough of the footprint actually touches the
+# surface it rests on, which keeps the packs from having items hanging over
+# empty space.
+
+DEFAULT_RESOLUTION = to_mm(5)
+MIN_SUPPORT = 0.75
+
+
+class HeightMap:
+    def __init__(self, container, resolution=DEFAULT_RESOLUTION, min_support=MIN_SUPPORT):
+        self.resolution = resolution
+        self.min_support = min_support
+        self.container_height = container['height']
+        # Partial cells at the far walls are left out, so any footprint
+        # found here is inside the container
+        self.shape = (
+            int(container['width'] // resolution),
+            int(container['depth'] // resolution),
+        )
+        self.heights = np.zeros(self.shape, dtype=COORD_DTYPE)
+        self.boxes = []
+
+    def _footprint(self, box):
+        start, end = box
+        res = self.resolution
+        return tuple(
+            slice(max(start[axis] // res, 0), min(-(-end[axis] // res), n))
+            for axis, n in enumerate(self.shape)
+        )
+
+    def append(self, box):
+        self.boxes.append(box)
+        cells = self._footprint(box)
+        self.heights[cells] = np.maximum(self.heights[cells], box[1][2])
+
+    def remove(self, box):
+        self.boxes.remove(box)
+        self.heights[:] = 0
+        for other in sorted(self.boxes, key=lambda b: b[1][2]):
+            cells = self._footprint(other)
+            self.heights[cells] = np.maximum(self.heights[cells], other[1][2])
+
+    def __iter__(self):
+        return iter(self.boxes)
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def resting_heights(self, a, b):
+        # For every a x b cell footprint: the height it would rest at and
+        # the fraction of its cells touching that height
+        nx, ny = self.shape
+        if a > nx or b > ny:
+            return np.zeros((0, 0)), np.zeros((0, 0))
+        windows = sliding_window_view(self.heights, (a, b))
+        rest = windows.max(axis=(2, 3))
+        touching = (windows == rest[..., None, None]).sum(axis=(2, 3))
+        return rest, touching / (a * b)
+
+
+def find_heightmap_position(container, used_positions, item):
+    heightmap = used_positions
+    res = heightmap.resolution
+    best = None
+    for rotation in rotate_item(item):
+        w, d, h = rotation
+        rest, support = heightmap.resting_heights(-(-w // res), -(-d // res))
+        ok = (rest + h <= heightmap.container_height) & (
+            (rest == 0) | (support >= heightmap.min_support)
+        )
+        if not ok.any():
+            continue
+        # Lowest resting height wins; np.argmin keeps the first (x, y) on ties
+        i, j = np.unravel_index(np.argmin(np.where(ok, rest, np.inf)), rest.shape)
+        z = int(rest[i, j])
+        key = (z, z + h, int(i), int(j))
+        if best is None or key < best[0]:
+            x, y = int(i) * res, int(j) * res
+            best = (key, ((x, y, z), (x + w, y + d, z + h)))
+    return best[1] if best else None
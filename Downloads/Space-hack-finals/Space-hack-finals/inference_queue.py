@@ -0,0 +1,139 @@
+import queue
+import threading
+import time
+from collections import Counter
+import numpy as np
+from fit_matrix import batch_scores
+
+
+# ---------- Micro-Batching Inference ----------
+# Concurrent placement requests each build a FitMatrix, which is one small
+# predict call per request. InferenceQueue stands in for the fit model and
+# merges those calls: a worker thread takes the first waiting request,
+# gathers whatever else is queued or arrives within max_wait seconds,
+# evaluates everything in one call and hands each caller its own rows back.
+# A lone request only pays the max_wait delay; with max_wait=0 only
+# requests already queued are merged.
+#
+# No batch is larger than max_batch rows: a larger request is queued as
+# several pieces of at most max_batch rows, and a request that would push a
+# batch past the cap waits to start the next one.
+#
+# stats() keeps histograms, in power-of-two buckets, of the rows per batch
+# and of the queue depth (requests waiting, the batch included) each time
+# a batch is formed. A request split into pieces counts once per piece.
+#
+# Threads and locks do not pickle, so worker processes (zone-parallel,
+# portfolio) keep getting the plain FitModel.
+
+DEFAULT_MAX_BATCH = 4096
+DEFAULT_MAX_WAIT = 0.0003
+
+
+def bucket(n):
+    # Upper bound of n's power-of-two bucket: 1, 2, 4, 8, ...
+    return 1 << max(n - 1, 0).bit_length()
+
+
+class PendingRows:
+    def __init__(self, rows):
+        self.rows = rows
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class InferenceQueue:
+    def __init__(self, fits, max_batch=DEFAULT_MAX_BATCH, max_wait=DEFAULT_MAX_WAIT):
+        self.fits = fits
+        # FitMatrix reads the wrapped model's threshold
+        self.threshold = getattr(fits, "threshold", None)
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.pending = queue.Queue()
+        # A request taken off the queue that did not fit the last batch
+        self.held = None
+        self.lock = threading.Lock()
+        self.worker = None
+        self.batches = 0
+        self.rows = 0
+        self.requests = 0
+        self.batch_sizes = Counter()
+        self.queue_depths = Counter()
+
+    def scores(self, rows):
+        rows = np.asarray(rows, dtype=float)
+        pieces = [
+            PendingRows(rows[start:start + self.max_batch])
+            for start in range(0, max(len(rows), 1), self.max_batch)
+        ]
+        with self.lock:
+            if self.worker is None:
+                self.worker = threading.Thread(target=self._run, daemon=True)
+                self.worker.start()
+        for piece in pieces:
+            self.pending.put(piece)
+        for piece in pieces:
+            piece.done.wait()
+            if piece.error is not None:
+                raise piece.error
+        if len(pieces) == 1:
+            return pieces[0].result
+        return np.concatenate([piece.result for piece in pieces])
+
+    def _gather(self):
+        if self.held is not None:
+            batch, self.held = [self.held], None
+        else:
+            batch = [self.pending.get()]
+        size = len(batch[0].rows)
+        deadline = time.perf_counter() + self.max_wait
+        while size < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining > 0:
+                    request = self.pending.get(timeout=remaining)
+                else:
+                    request = self.pending.get_nowait()
+            except queue.Empty:
+                break
+            if size + len(request.rows) > self.max_batch:
+                self.held = request
+                break
+            batch.append(request)
+            size += len(request.rows)
+        return batch, size
+
+    def _run(self):
+        while True:
+            batch, size = self._gather()
+            with self.lock:
+                self.batches += 1
+                self.rows += size
+                self.requests += len(batch)
+                self.batch_sizes[bucket(size)] += 1
+                waiting = self.pending.qsize() + (self.held is not None)
+                self.queue_depths[bucket(len(batch) + waiting)] += 1
+            try:
+                scores = batch_scores(self.fits, np.vstack([request.rows for request in batch]))
+                ends = np.cumsum([len(request.rows) for request in batch])[:-1]
+                for request, result in zip(batch, np.split(scores, ends)):
+                    request.result = result
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+            for request in batch:
+                request.done.set()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "maxBatch": self.max_batch,
+                "maxWaitMs": self.max_wait * 1000,
+                "batches": self.batches,
+                "requests": self.requests,
+                "rows": self.rows,
+                "queued": self.pending.qsize(),
+                "batchSizeHistogram": {str(k): v for k, v in sorted(self.batch_sizes.items())},
+                "queueDepthHistogram": {str(k): v for k, v in sorted(self.queue_depths.items())},
+            }
@@ -0,0 +1,86 @@
+import numpy as np
+from shape_memo import rotations
+from units import COORD_DTYPE, to_mm
+
+
+# ---------- JIT-Compiled Geometry Kernels ----------
+# Array versions of overlaps, fits_inside and the 5 cm lattice scan of
+# find_free_position, compiled with Numba when it is installed. Without
+# Numba (or with NUMBA_DISABLE_JIT=1) the same functions run as plain
+# Python on the same arrays, so results are identical either way; only the
+# speed differs.
+#
+# Boxes are rows of x0, y0, z0, x1, y1, z1, like BoxArray.
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+    def njit(*args, **kwargs):
+        def decorate(func):
+            return func
+        return decorate
+
+LATTICE_STEP = to_mm(5)
+
+
+@njit(cache=True)
+def overlaps(a, b):
+    return not (
+        a[3] <= b[0] or a[0] >= b[3] or
+        a[4] <= b[1] or a[1] >= b[4] or
+        a[5] <= b[2] or a[2] >= b[5]
+    )
+
+
+@njit(cache=True)
+def fits_inside(box, container_w, container_d, container_h):
+    return box[3] <= container_w and box[4] <= container_d and box[5] <= container_h
+
+
+@njit(cache=True)
+def scan_lattice(placed, container_w, container_d, container_h, w, d, h, step):
+    # First free lattice point in width, depth, height order, as the
+    # triple loop in find_free_position; returns found, x, y, z
+    box = np.empty(6, dtype=placed.dtype)
+    x = 0
+    while x + w <= container_w:
+        y = 0
+        while y + d <= container_d:
+            z = 0
+            while z + h <= container_h:
+                box[0], box[1], box[2] = x, y, z
+                box[3], box[4], box[5] = x + w, y + d, z + h
+                free = True
+                for i in range(placed.shape[0]):
+                    if overlaps(box, placed[i]):
+                        free = False
+                        break
+                if free and fits_inside(box, container_w, container_d, container_h):
+                    return True, x, y, z
+                z += step
+            y += step
+        x += step
+    return False, 0, 0, 0
+
+
+def placed_array(used_positions):
+    if hasattr(used_positions, 'array'):
+        return used_positions.array
+    return np.array([(*start, *end) for start, end in used_positions], dtype=COORD_DTYPE).reshape(-1, 6)
+
+
+def find_jit_lattice_position(container, used_positions, item, step=LATTICE_STEP):
+    placed = placed_array(used_positions)
+    dims = (item['width'], item['depth'], item['height'])
+    for w, d, h in rotations(dims):
+        found, x, y, z = scan_lattice(
+            placed, container['width'], container['depth'],
+            container['height'], w, d, h, step,
+        )
+        if found:
+            x, y, z = int(x), int(y), int(z)
+            return ((x, y, z), (x + w, y + d, z + h))
+    return None
@@ -1,18 +1,78 @@
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Response
 from pydantic import BaseModel
 from typing import List, Optional
-import joblib
+import json
+import os
+import threading
+import time
 import uvicorn
-from itertools import permutations
 from datetime import datetime
+import placement_backends
+from fit_matrix import FitMatrix, cascade_stats
+from inference_queue import DEFAULT_MAX_BATCH, DEFAULT_MAX_WAIT, InferenceQueue
+from numpy_models import load_fit_model
+from portfolio import DEFAULT_SECONDS, ORDERINGS, run_portfolio
+from rearrangement import rearrangement_steps
+from result_cache import ResultCache, canonical_key
+from shape_memo import rotate_item
+from units import box_to_cm, container_to_mm, item_to_mm, to_mm
+from zone_parallel import UNPLACED_REASONS, FitModel, pack_items, place_by_zone
+from spatial_index import collides
 
 app = FastAPI()
 
 # ---------- Load Model ----------
+# The NumPy export (see numpy_models.py) only needs NumPy; the joblib
+# pickle is still accepted but needs scikit-learn. Both are memory-mapped
+# read-only, so every worker on a node shares one copy of the model's
+# arrays through the page cache.
 try:
-    model = joblib.load("container_fit_model.pkl")
+    if os.path.exists("container_fit_model.npz"):
+        model = load_fit_model("container_fit_model.npz", mmap=True)
+    else:
+        import joblib
+        model = joblib.load("container_fit_model.pkl", mmap_mode="r")
 except Exception as e:
-    raise RuntimeError("❌ Could not load model. Ensure 'container_fit_model.pkl' is in the project root.")
+    raise RuntimeError("❌ Could not load model. Ensure 'container_fit_model.npz' or 'container_fit_model.pkl' is in the project root.")
+
+# ---------- Inference Queue ----------
+# In-process fit-model calls from concurrent requests are merged into one
+# batch (see inference_queue.py). INFERENCE_MAX_BATCH caps the rows per
+# batch, INFERENCE_MAX_WAIT_MS is how long a batch waits for more.
+inference = InferenceQueue(
+    FitModel(model),
+    max_batch=int(os.environ.get("INFERENCE_MAX_BATCH", DEFAULT_MAX_BATCH)),
+    max_wait=float(os.environ.get("INFERENCE_MAX_WAIT_MS", DEFAULT_MAX_WAIT * 1000)) / 1000,
+)
+
+# ---------- Warmup ----------
+# The first predict call pays for page faults and lazy setup. Each worker
+# warms up in the background at import, sending every warmup pair through
+# the inference queue to the model (cascade off, or geometry would settle
+# them all). /api/ready answers 503 until that is done, so a load balancer
+# only sends traffic to warm workers.
+model_ready = threading.Event()
+warmup = {"seconds": None, "error": None}
+
+def warm_up():
+    started = time.time()
+    try:
+        items = [
+            {"itemId": f"warmup-{size}", "width": to_mm(size), "depth": to_mm(size), "height": to_mm(size), "priority": 50}
+            for size in (5, 20, 50)
+        ]
+        containers = [
+            {"containerId": f"warmup-{size}", "width": to_mm(size), "depth": to_mm(size), "height": to_mm(size)}
+            for size in (40, 100)
+        ]
+        FitMatrix(items, containers, inference, cascade=False)
+    except Exception as e:
+        warmup["error"] = str(e)
+        return
+    warmup["seconds"] = round(time.time() - started, 4)
+    model_ready.set()
+
+threading.Thread(target=warm_up, daemon=True).start()
 
 # ---------- Schemas ----------
 class Coordinates(BaseModel):
@@ -46,21 +106,15 @@ class Container(BaseModel):
 class PlacementRequest(BaseModel):
     items: List[Item]
     containers: List[Container]
+    engine: str = "extreme_points"
+    stamp: bool = False
+    rearrange: bool = False
+    parallel: bool = False
+    portfolio: bool = False
+    deadlineMs: Optional[int] = None
+    keepImproving: bool = False
 
 # ---------- Placement Logic ----------
-def rotate_item(item):
-    dims = (item['width'], item['depth'], item['height'])
-    return list(set(permutations(dims)))
-
-def overlaps(pos1, pos2):
-    a_start, a_end = pos1
-    b_start, b_end = pos2
-    return not (
-        a_end[0] <= b_start[0] or a_start[0] >= b_end[0] or
-        a_end[1] <= b_start[1] or a_start[1] >= b_end[1] or
-        a_end[2] <= b_start[2] or a_start[2] >= b_end[2]
-    )
-
 def fits_inside(box, container):
     _, end = box
     return (
@@ -69,64 +123,260 @@ def fits_inside(box, container):
         end[2] <= container['height']
     )
 
+# Placement geometry is in integer millimetres (see units.py)
+GRID_STEP = to_mm(5)
+
 def find_free_position(container, used_positions, item):
     for rotation in rotate_item(item):
         w, d, h = rotation
-        for x in range(0, container['width'] - w + 1, 5):
-            for y in range(0, container['depth'] - d + 1, 5):
-                for z in range(0, container['height'] - h + 1, 5):
+        for x in range(0, container['width'] - w + 1, GRID_STEP):
+            for y in range(0, container['depth'] - d + 1, GRID_STEP):
+                for z in range(0, container['height'] - h + 1, GRID_STEP):
                     start = (x, y, z)
                     end = (x + w, y + d, z + h)
                     box = (start, end)
-                    if any(overlaps(box, used) for used in used_positions):
+                    if collides(used_positions, box):
                         continue
                     if fits_inside(box, container):
                         return box
     return None
 
+# "grid" is the original 5 cm lattice scan, kept for comparison
+POSITION_SEARCH = {"grid": find_free_position, **placement_backends.POSITION_SEARCH}
+
+def placement_entry(item_id, container_id, box):
+    box = box_to_cm(box)
+    return {
+        "itemId": item_id,
+        "containerId": container_id,
+        "position": {
+            "startCoordinates": {
+                "width": box[0][0], "depth": box[0][1], "height": box[0][2]
+            },
+            "endCoordinates": {
+                "width": box[1][0], "depth": box[1][1], "height": box[1][2]
+            }
+        }
+    }
+
+# ---------- Stored Arrangement ----------
+# Item locations from the last placement run, so retrieving or undocking
+# knows which items were where. Every placement request takes a new
+# generation when it starts and only stores its arrangement while that
+# generation is still the newest, so a slow or background run never
+# overwrites the arrangement of a request that came after it.
+item_locations = {}
+arrangement = {"generation": 0}
+arrangement_lock = threading.Lock()
+
+def next_generation():
+    with arrangement_lock:
+        arrangement["generation"] += 1
+        return arrangement["generation"]
+
+def store_arrangement(locations, generation):
+    with arrangement_lock:
+        if arrangement["generation"] != generation:
+            return False
+        item_locations.clear()
+        item_locations.update(locations)
+        return True
+
+def release_item(item_id):
+    with arrangement_lock:
+        return item_locations.pop(item_id, None) is not None
+
+# ---------- Placement Cache ----------
+# Repeated manifests are answered from ResultCache. Set PLACEMENT_CACHE_DIR
+# to keep results on disk across restarts.
+placement_cache = ResultCache(directory=os.environ.get("PLACEMENT_CACHE_DIR") or None)
+
+def is_anytime(data):
+    return data.deadlineMs is not None and not (data.parallel or data.portfolio)
+
+def canonical_request(data):
+    # Items go in the order placement visits them (priority, then input
+    # order), so only reorderings that cannot change the result share a key.
+    # Container order decides between candidates and is kept as given. The
+    # anytime path answers with a different body (unplacedItems), so it gets
+    # its own keys.
+    items = sorted(data.items, key=lambda x: -x.priority)
+    return {
+        "path": "anytime" if is_anytime(data) else "full",
+        "engine": data.engine,
+        "stamp": data.stamp,
+        "rearrange": data.rearrange,
+        "parallel": data.parallel,
+        "portfolio": data.portfolio,
+        "items": [item.dict() for item in items],
+        "containers": [c.dict() for c in data.containers],
+    }
+
 # ---------- Placement API ----------
 @app.post("/api/placement")
 def placement_api(data: PlacementRequest):
-    placements = []
-    rearrangements = []
-    used_space = {c.containerId: [] for c in data.containers}
-    items_sorted = sorted(data.items, key=lambda x: -x.priority)
-
-    for item in items_sorted:
-        placed = False
-        item_dict = item.dict()
-        preferred = [c for c in data.containers if c.zone == item.preferredZone]
-        fallback = [c for c in data.containers if c.zone != item.preferredZone]
-        candidate_containers = preferred + fallback
-
-        for container in candidate_containers:
-            try:
-                features = [[
-                    item.width, item.depth, item.height, item.priority,
-                    container.width, container.depth, container.height
-                ]]
-                if model.predict(features)[0] == 1:
-                    box = find_free_position(container.dict(), used_space[container.containerId], item_dict)
-                    if box:
-                        used_space[container.containerId].append(box)
-                        placements.append({
-                            "itemId": item.itemId,
-                            "containerId": container.containerId,
-                            "position": {
-                                "startCoordinates": {
-                                    "width": box[0][0], "depth": box[0][1], "height": box[0][2]
-                                },
-                                "endCoordinates": {
-                                    "width": box[1][0], "depth": box[1][1], "height": box[1][2]
-                                }
-                            }
-                        })
-                        placed = True
-                        break
-            except:
-                continue
-
-    return {"success": True, "placements": placements, "rearrangements": rearrangements}
+    if data.engine not in POSITION_SEARCH:
+        raise HTTPException(status_code=400, detail=f"Unknown placement engine '{data.engine}'")
+    generation = next_generation()
+    key = canonical_key(canonical_request(data))
+    cached = placement_cache.get(key)
+    if cached is None and is_anytime(data):
+        return anytime_placement(data, key, generation)
+    if cached is None:
+        result, locations, complete = run_placement(data)
+        cached = (json_body(result), locations)
+        # A result the deadline cut short is not what the same request
+        # with more time would get, so it is not cached
+        if complete:
+            placement_cache.put(key, cached)
+    store_arrangement(cached[1], generation)
+    return Response(content=cached[0], media_type="application/json")
+
+@app.get("/api/ready")
+def readiness():
+    if not model_ready.is_set():
+        detail = f"Model warmup failed: {warmup['error']}" if warmup["error"] else "Model is warming up"
+        raise HTTPException(status_code=503, detail=detail)
+    return {"ready": True, "warmupSeconds": warmup["seconds"], "pid": os.getpid()}
+
+@app.get("/api/inference/stats")
+def inference_stats():
+    return {**inference.stats(), "cascade": cascade_stats()}
+
+@app.get("/api/placement/cache")
+def placement_cache_stats():
+    return {"success": True, **placement_cache.stats()}
+
+def json_body(result):
+    return json.dumps(result, ensure_ascii=False, separators=(",", ":")).encode()
+
+# ---------- Anytime Placement ----------
+# With deadlineMs, placement stops when the budget runs out and returns what
+# it placed so far, plus every unplaced item and why. With keepImproving the
+# run goes on in a background thread instead: the response is a snapshot at
+# the deadline, and once the run finishes its result replaces the stored
+# arrangement (unless another placement request came in meanwhile), goes
+# into the cache and is served by /api/placement/latest. Only complete
+# results are cached. With portfolio the deadline is the portfolio's
+# shared deadline instead, and with parallel it holds for every zone worker
+# and the overflow pass; a result either one cut short is not cached.
+latest_run = {"id": 0, "complete": True, "result": None}
+latest_run_lock = threading.Lock()
+
+def anytime_result(placed, items_mm, reasons, steps):
+    placed_ids = {item_dict['itemId'] for item_dict, _, _ in placed}
+    unplaced = []
+    for item_dict in items_mm:
+        if item_dict['itemId'] not in placed_ids:
+            reason = reasons.get(item_dict['itemId'], "deadline")
+            unplaced.append({"itemId": item_dict['itemId'], "reason": reason, "detail": UNPLACED_REASONS[reason]})
+    return {
+        "success": True,
+        "placements": [placement_entry(item_dict['itemId'], cid, box) for item_dict, cid, box in placed],
+        "rearrangements": rearrangement_steps(steps),
+        "unplacedItems": unplaced,
+    }
+
+def anytime_placement(data, key, generation):
+    deadline = time.time() + data.deadlineMs / 1000
+    containers_mm = [container_to_mm(c.dict()) for c in data.containers]
+    items_mm = sorted((item_to_mm(item.dict()) for item in data.items), key=placement_backends.placement_order(data.engine))
+    stamp = data.stamp and data.engine in placement_backends.MONOTONE_SEARCH
+    placed = []
+    reasons = {}
+    steps = []
+
+    def run(until):
+        pack_items(
+            items_mm, containers_mm, data.engine, POSITION_SEARCH[data.engine], inference, stamp,
+            deadline=until, reasons=reasons, placed=placed, rearrange=data.rearrange, steps=steps,
+        )
+
+    def finish():
+        result = anytime_result(placed, items_mm, reasons, steps)
+        locations = {item_dict['itemId']: (cid, box) for item_dict, cid, box in placed}
+        if not any(reason == "deadline" for reason in reasons.values()):
+            placement_cache.put(key, (json_body(result), locations))
+        return result, locations
+
+    if not data.keepImproving:
+        run(deadline)
+        result, locations = finish()
+        store_arrangement(locations, generation)
+        return Response(content=json_body(result), media_type="application/json")
+
+    with latest_run_lock:
+        latest_run.update(id=latest_run["id"] + 1, complete=False, result=None)
+        run_id = latest_run["id"]
+
+    def improve():
+        run(None)
+        result, locations = finish()
+        with latest_run_lock:
+            if latest_run["id"] == run_id:
+                latest_run.update(complete=True, result=result)
+        store_arrangement(locations, generation)
+
+    worker = threading.Thread(target=improve, daemon=True)
+    worker.start()
+    worker.join(max(deadline - time.time(), 0))
+    snapshot = list(placed)
+    result = anytime_result(snapshot, items_mm, dict(reasons), list(steps))
+    with latest_run_lock:
+        if latest_run["id"] == run_id and not latest_run["complete"]:
+            result["improving"] = True
+            latest_run["result"] = result
+            locations = {item_dict['itemId']: (cid, box) for item_dict, cid, box in snapshot}
+            store_arrangement(locations, generation)
+    return Response(content=json_body(result), media_type="application/json")
+
+@app.get("/api/placement/latest")
+def latest_placement():
+    with latest_run_lock:
+        if latest_run["result"] is None:
+            raise HTTPException(status_code=404, detail="No anytime placement has run yet")
+        return {**latest_run["result"], "improving": not latest_run["complete"]}
+
+def run_placement(data):
+    find_position = POSITION_SEARCH[data.engine]
+    # Geometry is converted to integer millimetres once, here
+    containers_mm = [container_to_mm(c.dict()) for c in data.containers]
+    items_mm = sorted((item_to_mm(item.dict()) for item in data.items), key=placement_backends.placement_order(data.engine))
+    # Stamping tiles copies without a support check, so it is kept to the
+    # engines without gravity rules
+    stamp = data.stamp and data.engine in placement_backends.MONOTONE_SEARCH
+    steps = []
+    complete = True
+
+    if data.portfolio:
+        # Every item ordering with the requested engine
+        seconds = data.deadlineMs / 1000 if data.deadlineMs is not None else DEFAULT_SECONDS
+        timed_out = []
+        _, placed, _ = run_portfolio(
+            items_mm, containers_mm, [(ordering, data.engine) for ordering in ORDERINGS],
+            POSITION_SEARCH, FitModel(model), stamp, seconds=seconds, timed_out=timed_out,
+        )
+        complete = not timed_out
+    elif data.parallel:
+        deadline = time.time() + data.deadlineMs / 1000 if data.deadlineMs is not None else None
+        reasons = {}
+        placed, _ = place_by_zone(
+            items_mm, containers_mm, data.engine, find_position, FitModel(model), stamp,
+            deadline=deadline, reasons=reasons,
+        )
+        complete = "deadline" not in reasons.values()
+    else:
+        # With rearrange, items that fit nowhere get a rearrangement attempt
+        # (no gravity engines)
+        placed, _, _ = pack_items(
+            items_mm, containers_mm, data.engine, find_position, inference, stamp,
+            rearrange=data.rearrange, steps=steps,
+        )
+
+    locations = {item_dict['itemId']: (cid, box) for item_dict, cid, box in placed}
+    placements = [placement_entry(item_dict['itemId'], cid, box) for item_dict, cid, box in placed]
+    result = {"success": True, "placements": placements, "rearrangements": rearrangement_steps(steps)}
+    return result, locations, complete
 
 # ---------- Search API ----------
 @app.get("/api/search")
@@ -154,6 +404,7 @@ def search_item(itemId: Optional[str] = None, itemName: Optional[str] = None, us
 # ---------- Retrieval API ----------
 @app.post("/api/retrieve")
 def retrieve_item(body: dict):
+    release_item(body.get("itemId"))
     return {"success": True}
 
 # ---------- Place API ----------
@@ -197,7 +448,12 @@ def return_plan(body: dict):
 
 @app.post("/api/waste/complete-undocking")
 def complete_undocking(body: dict):
-    return {"success": True, "itemsRemoved": 2}
+    container_id = body.get("undockingContainerId")
+    with arrangement_lock:
+        undocked = [item_id for item_id, (cid, _) in item_locations.items() if cid == container_id]
+    for item_id in undocked:
+        release_item(item_id)
+    return {"success": True, "itemsRemoved": len(undocked)}
 
 # ---------- Time Simulation API ----------
 @app.post("/api/simulate/day")
@@ -242,4 +498,4 @@ def logs(startDate: Optional[str] = None, endDate: Optional[str] = None):
 
 # ---------- Run App ----------
 if __name__ == "__main__":
-    uvicorn.run("main_api:app", host="0.0.0.0", port=8000)
+    uvicorn.run("main_api:app", host="0.0.0.0", port=8000, workers=int(os.environ.get("API_WORKERS", 1)))
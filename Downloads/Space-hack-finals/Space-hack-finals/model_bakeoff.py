@@ -0,0 +1,246 @@
+import argparse
+import os
+import time
+import tracemalloc
+import warnings
+import numpy as np
+import placement_backends
+from benchmark_placement import load_containers, load_items
+from container_index import ContainerIndex
+from numpy_models import load_fit_model
+from zone_parallel import pack_items
+
+
+# ---------- Fit Model Bake-off ----------
+# Compares the fit models against each other and against the exact
+# geometric check, on cost and on how they affect placement:
+#
+#   python model_bakeoff.py --pairs 20000 --items 500
+#
+# Pairs: random items (5-120 cm per side) against random containers
+# (40-150 cm), labelled by the exact check (the item fits the empty
+# container in some rotation). For each model:
+#   - per-call latency (one row per predict, like the old placement loop)
+#     and batched latency per row (one predict over every pair)
+#   - memory allocated while loading it (tracemalloc) and its file size
+#   - false-positive rate: pairs the model accepts that cannot fit, each
+#     one a wasted position search; false negatives are items it turns away
+#     from a container that could hold them
+# Placement: input_items.csv / containers.csv through the real search, with
+# the model's answers as the only filter besides ContainerIndex (the
+# geometric cascade of FitMatrix is off, so every pair is the model's
+# call). Counts the searches that found nothing (wasted scans) and the
+# items placed.
+#
+# Models that are missing, or whose library is not installed, are skipped.
+# The XGBoost generation was never saved, so it is retrained from the
+# recipe in not_important/final_code_with_balanced_model.py. The forest
+# and NN in the repo were trained on pairs that all fit, so they accept
+# everything.
+
+def random_pairs(n, seed=0):
+    rng = np.random.default_rng(seed)
+    items = rng.integers(5, 121, (n, 3))
+    priority = rng.integers(1, 101, (n, 1))
+    containers = rng.integers(40, 151, (n, 3))
+    rows = np.hstack([items, priority, containers]).astype(float)
+    return rows, geometric_fit(rows)
+
+
+def geometric_fit(rows):
+    # Exact: every sorted item side within the matching container side
+    rows = np.asarray(rows, dtype=float)
+    return (np.sort(rows[:, :3], axis=1) <= np.sort(rows[:, 4:7], axis=1)).all(axis=1)
+
+
+class Candidate:
+    def __init__(self, name, accept, load_bytes=None, file_bytes=None):
+        self.name = name
+        self.accept = accept
+        self.load_bytes = load_bytes
+        self.file_bytes = file_bytes
+
+
+def measured_load(load):
+    tracemalloc.start()
+    try:
+        loaded = load()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return loaded, peak
+
+
+def file_size(*paths):
+    return sum(os.path.getsize(path) for path in paths)
+
+
+def sklearn_candidates():
+    import joblib
+    from sklearn.exceptions import InconsistentVersionWarning
+    warnings.filterwarnings("ignore", category=InconsistentVersionWarning)
+    found = []
+    path = "not_important/container_fit_model.pkl"
+    if os.path.exists(path):
+        forest, peak = measured_load(lambda: joblib.load(path))
+        found.append(Candidate("forest (sklearn)", lambda rows: forest.predict(rows) == 1, peak, file_size(path)))
+    paths = ("container_fit_nn_model.pkl", "container_fit_nn_scaler.pkl")
+    if all(os.path.exists(p) for p in paths):
+        (nn, scaler), peak = measured_load(lambda: tuple(joblib.load(p) for p in paths))
+        found.append(Candidate(
+            "nn + scaler (sklearn)", lambda rows: nn.predict(scaler.transform(rows)) >= 0.0, peak, file_size(*paths)
+        ))
+    return found
+
+
+def numpy_candidates():
+    found = []
+    for name, path, threshold in (
+        ("forest (numpy)", "container_fit_model.npz", 1),
+        ("nn (numpy)", "container_fit_nn_model.npz", 0.0),
+    ):
+        if os.path.exists(path):
+            model, peak = measured_load(lambda: load_fit_model(path))
+            found.append(Candidate(
+                name, lambda rows, model=model, threshold=threshold: model.predict(rows) >= threshold,
+                peak, file_size(path),
+            ))
+    return found
+
+
+def keras_candidates():
+    from tensorflow.keras.models import load_model
+
+    path = "container_fit_nn_model.h5"
+    if not os.path.exists(path):
+        return []
+    import joblib
+    scaler = joblib.load("container_fit_nn_scaler.pkl")
+    nn, peak = measured_load(lambda: load_model(path))
+    return [Candidate(
+        "nn (keras .h5)", lambda rows: nn.predict(scaler.transform(rows), verbose=0)[:, 0] >= 0.5,
+        peak, file_size(path),
+    )]
+
+
+def xgboost_candidates(seed=42):
+    from xgboost import XGBClassifier
+
+    # The training script's recipe: 9 features, with item mass and a
+    # zone-match flag, balanced 2500/2500. Its sizes (items 5-49 cm,
+    # containers 50-149 cm) never produce a non-fitting pair, so the sizes
+    # of the bake-off pairs are used instead.
+    rng = np.random.default_rng(seed)
+    n = 50000
+    item = rng.integers(5, 121, (n, 3))
+    container = rng.integers(40, 151, (n, 3))
+    mass = item.prod(axis=1) / 2000 + rng.uniform(0.1, 5.0, n)
+    rows = np.column_stack([item, mass, rng.integers(1, 101, n), rng.integers(0, 2, n), container])
+    label = (item <= container).all(axis=1).astype(int)
+    picked = np.concatenate([
+        rng.choice(np.flatnonzero(label == 0), 2500, replace=False),
+        rng.choice(np.flatnonzero(label == 1), 2500, replace=False),
+    ])
+    model = XGBClassifier(eval_metric="logloss")
+    model.fit(rows[picked], label[picked])
+
+    def accept(rows):
+        # Missing features: the average mass for the volume, zone matched
+        rows = np.asarray(rows, dtype=float)
+        mass = rows[:, :3].prod(axis=1) / 2000 + 2.55
+        return model.predict(np.column_stack([rows[:, :3], mass, rows[:, 3], np.ones(len(rows)), rows[:, 4:7]])) == 1
+
+    return [Candidate("xgboost (retrained)", accept, file_bytes=len(model.get_booster().save_raw("ubj")))]
+
+
+def all_candidates():
+    found = [Candidate("geometric (exact)", geometric_fit)]
+    for loader in (sklearn_candidates, numpy_candidates, keras_candidates, xgboost_candidates):
+        try:
+            found.extend(loader())
+        except ImportError as e:
+            print(f"[skip] {loader.__name__}: {e}")
+    return found
+
+
+# ---------- Measurements ----------
+
+def latency(candidate, rows, calls):
+    start = time.perf_counter()
+    for row in rows[:calls]:
+        candidate.accept(row[None, :])
+    per_call = (time.perf_counter() - start) / min(calls, len(rows))
+    start = time.perf_counter()
+    accepted = np.asarray(candidate.accept(rows), dtype=bool)
+    per_row = (time.perf_counter() - start) / len(rows)
+    return per_call, per_row, accepted
+
+
+def kilobytes(size):
+    return "-" if size is None else f"{size / 1024:.1f}"
+
+
+def error_rates(accepted, truth):
+    false_positive = (accepted & ~truth).sum() / max((~truth).sum(), 1)
+    false_negative = (~accepted & truth).sum() / max(truth.sum(), 1)
+    return false_positive, false_negative
+
+
+class Predicate:
+    # FitMatrix takes any callable; this one answers a batch at once
+    def __init__(self, accept):
+        self.accept = accept
+
+    def scores(self, rows):
+        return np.asarray(self.accept(np.asarray(rows, dtype=float)), dtype=bool)
+
+
+class CountingIndex(ContainerIndex):
+    # Counts the position searches that found nothing (wasted scans)
+    def __init__(self, containers, learn_failures=False):
+        super().__init__(containers, learn_failures)
+        self.failures = 0
+
+    def record_failure(self, cid, item):
+        self.failures += 1
+        super().record_failure(cid, item)
+
+
+def placement_effect(candidate, items, containers, engine):
+    # The real placement loop (zone_parallel.pack_items) with the cascade
+    # off, so every pair is the candidate's call
+    container_index = CountingIndex(
+        containers, learn_failures=engine in placement_backends.MONOTONE_SEARCH
+    )
+    start = time.perf_counter()
+    placed, _, _ = pack_items(
+        sorted(items, key=placement_backends.placement_order(engine)), containers, engine,
+        placement_backends.POSITION_SEARCH[engine], Predicate(candidate.accept),
+        container_index=container_index, cascade=False,
+    )
+    return len(placed), container_index.failures, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pairs", type=int, default=20000, help="random item/container pairs to score")
+    parser.add_argument("--calls", type=int, default=200, help="single-row predict calls timed per model")
+    parser.add_argument("--items", type=int, default=500, help="items from input_items.csv for the placement run")
+    parser.add_argument("--engine", default="extreme_points", choices=sorted(placement_backends.POSITION_SEARCH))
+    args = parser.parse_args()
+
+    rows, truth = random_pairs(args.pairs)
+    items = load_items()[:args.items]
+    containers = load_containers()
+    candidates = all_candidates()
+    print(f"{args.pairs} pairs ({truth.mean():.0%} fit), placement: {len(items)} items, "
+          f"{len(containers)} containers, engine {args.engine}")
+    print(f"{'model':24s} {'call us':>9s} {'batch us':>9s} {'load KB':>9s} {'file KB':>9s} "
+          f"{'FP rate':>8s} {'FN rate':>8s} {'placed':>7s} {'wasted':>7s} {'place s':>8s}")
+    for candidate in candidates:
+        per_call, per_row, accepted = latency(candidate, rows, args.calls)
+        false_positive, false_negative = error_rates(accepted, truth)
+        placed, wasted, seconds = placement_effect(candidate, items, containers, args.engine)
+        print(f"{candidate.name:24s} {per_call * 1e6:9.1f} {per_row * 1e6:9.2f} "
+              f"{kilobytes(candidate.load_bytes):>9s} {kilobytes(candidate.file_bytes):>9s} "
+              f"{false_positive:8.2%} {false_negative:8.2%} {placed:7d} {wasted:7d} {seconds:8.2f}")
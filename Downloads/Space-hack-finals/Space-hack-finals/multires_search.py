@@ -0,0 +1,134 @@
+from math import ceil
+import numpy as np
+from units import to_mm
+from shape_memo import rotate_item
+from voxel_grid import VoxelGrid, empty_origins, summed_area
+
+
+# ---------- Coarse-to-Fine Position Search ----------
+# An occupancy pyramid on top of the voxel grid: level L merges 2**L fine
+# voxels per axis. Two pooled copies are kept per level:
+#   - "any": a coarse voxel is occupied if any fine voxel under it is. An
+#     empty coarse block is therefore empty at full resolution, so a coarse
+#     hit can be returned without further checks.
+#   - "all": a coarse voxel is full only if every fine voxel under it is.
+#     Fine origins under a full coarse voxel are skipped.
+# The search tries the coarsest level first. It drops to finer levels only
+# when the coarse ones find nothing. At the finest level it only tests free
+# voxels whose parent is not full, so the cost follows how much free surface
+# is left rather than the container volume.
+
+DEFAULT_MIN_STEP = to_mm(5)
+DEFAULT_LEVELS = 3
+
+
+def pool(occupied, factor, reduce):
+    # Pads with occupied voxels so partial blocks at the far walls are
+    # never treated as free
+    padded_shape = tuple(ceil(n / factor) * factor for n in occupied.shape)
+    padded = np.ones(padded_shape, dtype=bool)
+    padded[:occupied.shape[0], :occupied.shape[1], :occupied.shape[2]] = occupied
+    nx, ny, nz = (n // factor for n in padded_shape)
+    blocks = padded.reshape(nx, factor, ny, factor, nz, factor)
+    return reduce(blocks, axis=(1, 3, 5))
+
+
+class OccupancyPyramid(VoxelGrid):
+    def __init__(self, container, min_step=DEFAULT_MIN_STEP, levels=DEFAULT_LEVELS):
+        super().__init__(container, resolution=min_step)
+        self.levels = levels
+        self.any_occupied = {}
+        self.all_occupied = {}
+        for level in range(1, levels):
+            self.any_occupied[level] = pool(self.occupied, 2 ** level, np.any)
+            self.all_occupied[level] = pool(self.occupied, 2 ** level, np.all)
+        self._coarse_sums = {}
+        self._parent_full = None
+
+    def append(self, box):
+        super().append(box)
+        # Only the coarse voxels above the new box are re-pooled
+        span = self._voxel_span(box)
+        for level in range(1, self.levels):
+            factor = 2 ** level
+            coarse = tuple(slice(s.start // factor, -(-s.stop // factor)) for s in span)
+            fine = tuple(slice(c.start * factor, c.stop * factor) for c in coarse)
+            self.any_occupied[level][coarse] = pool(self.occupied[fine], factor, np.any)
+            self.all_occupied[level][coarse] = pool(self.occupied[fine], factor, np.all)
+        self._coarse_sums = {}
+        self._parent_full = None
+
+    def remove(self, box):
+        super().remove(box)
+        for level in range(1, self.levels):
+            self.any_occupied[level] = pool(self.occupied, 2 ** level, np.any)
+            self.all_occupied[level] = pool(self.occupied, 2 ** level, np.all)
+        self._coarse_sums = {}
+        self._parent_full = None
+
+    def coarse_sums(self, level):
+        if level not in self._coarse_sums:
+            self._coarse_sums[level] = summed_area(self.any_occupied[level])
+        return self._coarse_sums[level]
+
+    @property
+    def parent_full(self):
+        # Level-1 "all" map expanded back to fine voxels
+        if self._parent_full is None:
+            full = self.all_occupied[1]
+            self._parent_full = full.repeat(2, 0).repeat(2, 1).repeat(2, 2)
+        return self._parent_full
+
+    def fine_candidates(self, a, b, c):
+        # Free fine voxels that can hold an a x b x c block without crossing
+        # the far walls and whose level-1 parent is not completely full
+        nx, ny, nz = self.shape
+        mask = ~self.occupied[:nx - a + 1, :ny - b + 1, :nz - c + 1]
+        if self.levels > 1:
+            sums = self.coarse_sums(1)
+            mask &= ~self.parent_full[:mask.shape[0], :mask.shape[1], :mask.shape[2]]
+            # A block starting at fine voxel i covers at least (a - 1) // 2
+            # whole level-1 voxels from ceil(i / 2) on, and those must be empty
+            inner = ((a - 1) // 2, (b - 1) // 2, (c - 1) // 2)
+            if min(inner) > 0:
+                coarse_free = empty_origins(sums, *inner)
+                if coarse_free.size == 0:
+                    return (np.array([], dtype=int),) * 3
+                index = [(np.arange(n) + 1) // 2 for n in mask.shape]
+                # Origins past the coarse map are never pruned by it
+                pad = [max(int(ix[-1]) + 1 - n, 0) for ix, n in zip(index, coarse_free.shape)]
+                coarse_free = np.pad(coarse_free, [(0, p) for p in pad], constant_values=True)
+                mask &= coarse_free[np.ix_(*index)]
+        return np.nonzero(mask)
+
+
+def find_multires_position(container, used_positions, item):
+    grid = used_positions
+    res = grid.resolution
+    rotations = rotate_item(item)
+
+    for level in range(grid.levels - 1, 0, -1):
+        step = res * 2 ** level
+        sums = grid.coarse_sums(level)
+        for rotation in rotations:
+            w, d, h = rotation
+            free = empty_origins(sums, -(-w // step), -(-d // step), -(-h // step))
+            hits = np.flatnonzero(free)
+            if hits.size:
+                i, j, k = np.unravel_index(hits[0], free.shape)
+                x, y, z = int(i) * step, int(j) * step, int(k) * step
+                return ((x, y, z), (x + w, y + d, z + h))
+
+    nx, ny, nz = grid.shape
+    for rotation in rotations:
+        w, d, h = rotation
+        a, b, c = -(-w // res), -(-d // res), -(-h // res)
+        if a > nx or b > ny or c > nz:
+            continue
+        i, j, k = grid.fine_candidates(a, b, c)
+        hits = np.flatnonzero(grid.is_free(i, j, k, a, b, c))
+        if hits.size:
+            first = hits[0]
+            x, y, z = int(i[first]) * res, int(j[first]) * res, int(k[first]) * res
+            return ((x, y, z), (x + w, y + d, z + h))
+    return None
@@ -0,0 +1,295 @@
+import argparse
+import json
+import os
+import struct
+import zipfile
+import numpy as np
+
+
+# ---------- NumPy Fit Models ----------
+# The fit models are exported once, offline, to a plain .npz file of weight
+# and tree arrays. Serving then evaluates them with NumPy alone, without
+# scikit-learn, XGBoost or TensorFlow. Every row is evaluated in one
+# vectorized pass.
+#
+#   python numpy_models.py container_fit_nn_model.pkl container_fit_nn_model.npz \
+#       --scaler container_fit_nn_scaler.pkl
+#   python numpy_models.py container_fit_model.pkl container_fit_model.npz
+#
+# Supported: MLPClassifier (with an optional StandardScaler folded in),
+# RandomForestClassifier / ExtraTreesClassifier and XGBClassifier with a
+# binary:logistic objective. predict() and predict_proba() return the same
+# labels and probabilities as the original models.
+
+ACTIVATIONS = {
+    "identity": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0),
+    "tanh": np.tanh,
+    "logistic": lambda x: 1 / (1 + np.exp(-x)),
+}
+
+
+def two_class_proba(positive):
+    return np.column_stack([1 - positive, positive])
+
+
+class MappedModel:
+    # A model loaded with mmap=True pickles as its file path, so process
+    # pools map the same file instead of each receiving a copy
+    mapped_from = None
+
+    def __reduce_ex__(self, protocol):
+        if self.mapped_from is not None:
+            return load_fit_model, (self.mapped_from, True)
+        return super().__reduce_ex__(protocol)
+
+
+class NumpyMLP(MappedModel):
+    def __init__(self, arrays):
+        self.classes = arrays["classes"]
+        self.mean = arrays.get("mean")
+        self.scale = arrays.get("scale")
+        layers = int(arrays["layers"])
+        self.coefs = [arrays[f"coef_{i}"] for i in range(layers)]
+        self.intercepts = [arrays[f"intercept_{i}"] for i in range(layers)]
+        self.activation = str(arrays["activation"])
+        self.out_activation = str(arrays["out_activation"])
+
+    def predict_proba(self, rows):
+        x = np.asarray(rows, dtype=float)
+        if self.mean is not None:
+            x = (x - self.mean) / self.scale
+        hidden = ACTIVATIONS[self.activation]
+        for coef, intercept in zip(self.coefs[:-1], self.intercepts[:-1]):
+            x = hidden(x @ coef + intercept)
+        out = x @ self.coefs[-1] + self.intercepts[-1]
+        if self.out_activation == "softmax":
+            out = np.exp(out - out.max(axis=1, keepdims=True))
+            return out / out.sum(axis=1, keepdims=True)
+        return two_class_proba(ACTIVATIONS[self.out_activation](out[:, 0]))
+
+    def predict(self, rows):
+        if len(self.classes) == 1:
+            return np.full(len(rows), self.classes[0])
+        return self.classes[self.predict_proba(rows).argmax(axis=1)]
+
+
+class NumpyTrees(MappedModel):
+    # Every tree's nodes in flat arrays; `roots` holds each tree's first
+    # node. Leaves have left == -1. A forest averages class probabilities
+    # and goes left on x <= threshold. A boosted model sums leaf margins and
+    # goes left on x < threshold (missing values follow `default_left`).
+    def __init__(self, arrays):
+        self.classes = arrays["classes"]
+        self.kind = str(arrays["kind"])
+        self.roots = arrays["roots"]
+        self.left = arrays["left"]
+        self.right = arrays["right"]
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.value = arrays["value"]
+        self.default_left = arrays.get("default_left")
+        self.base_margin = float(arrays.get("base_margin", 0.0))
+
+    def leaves(self, rows):
+        # (rows x trees) leaf indices. Every row walks every tree at once;
+        # pairs drop out as they reach a leaf.
+        x = np.asarray(rows, dtype=np.float32).astype(float)
+        trees = len(self.roots)
+        node = np.tile(self.roots, len(x))
+        row = np.repeat(np.arange(len(x)), trees)
+        active = np.flatnonzero(self.left[node] != -1)
+        while active.size:
+            current = node[active]
+            values = x[row[active], self.feature[current]]
+            if self.kind == "forest":
+                go_left = values <= self.threshold[current]
+            else:
+                go_left = np.where(np.isnan(values), self.default_left[current], values < self.threshold[current])
+            node[active] = np.where(go_left, self.left[current], self.right[current])
+            active = active[self.left[node[active]] != -1]
+        return node.reshape(len(x), trees)
+
+    def predict_proba(self, rows):
+        leaves = self.leaves(rows)
+        if self.kind == "forest":
+            return self.value[leaves].mean(axis=1)
+        margin = self.base_margin + self.value[leaves].sum(axis=1)
+        return two_class_proba(1 / (1 + np.exp(-margin)))
+
+    def predict(self, rows):
+        if len(self.classes) == 1:
+            return np.full(len(rows), self.classes[0])
+        return self.classes[self.predict_proba(rows).argmax(axis=1)]
+
+
+MODEL_KINDS = {"mlp": NumpyMLP, "forest": NumpyTrees, "boosted": NumpyTrees}
+
+
+def mapped_arrays(path):
+    # The arrays of an uncompressed .npz as read-only memory maps of the
+    # file itself. Every process that maps the same file shares its pages,
+    # so N workers hold one copy of the model between them.
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, "rb") as f:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{path} is compressed and cannot be memory-mapped")
+            # Local file header: 30 bytes, then the name and extra fields
+            f.seek(info.header_offset + 26)
+            name_length, extra_length = struct.unpack("<HH", f.read(4))
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            name = info.filename[:-len(".npy")]
+            if dtype.hasobject:
+                raise ValueError(f"{path} holds object arrays")
+            if not shape or 0 in shape:
+                # Scalars and empty arrays are read normally
+                f.seek(info.header_offset + 30 + name_length + extra_length)
+                arrays[name] = np.lib.format.read_array(f, allow_pickle=False)
+                continue
+            arrays[name] = np.memmap(
+                path, dtype=dtype, mode="r", shape=shape,
+                order="F" if fortran_order else "C", offset=f.tell(),
+            )
+    return arrays
+
+
+def load_fit_model(path, mmap=False):
+    if mmap:
+        arrays = mapped_arrays(path)
+    else:
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {name: data[name] for name in data.files}
+    model = MODEL_KINDS[str(arrays["kind"])](arrays)
+    if mmap:
+        model.mapped_from = os.path.abspath(path)
+    return model
+
+
+# ---------- Export ----------
+# Only reads attributes of the fitted models, so exporting needs the
+# libraries that trained them but serving does not.
+
+def mlp_arrays(model, scaler=None):
+    arrays = {
+        "kind": "mlp",
+        "classes": np.asarray(model.classes_),
+        "layers": len(model.coefs_),
+        "activation": model.activation,
+        "out_activation": model.out_activation_,
+    }
+    for i, (coef, intercept) in enumerate(zip(model.coefs_, model.intercepts_)):
+        arrays[f"coef_{i}"] = coef
+        arrays[f"intercept_{i}"] = intercept
+    if scaler is not None:
+        arrays["mean"] = scaler.mean_
+        arrays["scale"] = scaler.scale_
+    return arrays
+
+
+def forest_arrays(model):
+    left, right, feature, threshold, value, roots = [], [], [], [], [], []
+    offset = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        leaf = tree.children_left == -1
+        roots.append(offset)
+        left.append(np.where(leaf, -1, tree.children_left + offset))
+        right.append(np.where(leaf, -1, tree.children_right + offset))
+        feature.append(np.where(leaf, 0, tree.feature))
+        threshold.append(tree.threshold)
+        counts = tree.value[:, 0, :]
+        value.append(counts / counts.sum(axis=1, keepdims=True))
+        offset += tree.node_count
+    return {
+        "kind": "forest",
+        "classes": np.asarray(model.classes_),
+        "roots": np.array(roots),
+        "left": np.concatenate(left),
+        "right": np.concatenate(right),
+        "feature": np.concatenate(feature),
+        "threshold": np.concatenate(threshold),
+        "value": np.concatenate(value),
+    }
+
+
+def boosted_arrays(model):
+    # From the booster's JSON dump, so the export does not depend on
+    # XGBoost's in-memory layout
+    learner = json.loads(model.get_booster().save_raw("json"))["learner"]
+    objective = learner["objective"]["name"]
+    if objective != "binary:logistic":
+        raise ValueError(f"Unsupported XGBoost objective '{objective}'")
+    base_score = float(str(learner["learner_model_param"]["base_score"]).strip("[]"))
+    trees = learner["gradient_booster"]["model"]["trees"]
+    left, right, feature, threshold, value, default_left, roots = [], [], [], [], [], [], []
+    offset = 0
+    for tree in trees:
+        children_left = np.array(tree["left_children"])
+        children_right = np.array(tree["right_children"])
+        leaf = children_left == -1
+        roots.append(offset)
+        left.append(np.where(leaf, -1, children_left + offset))
+        right.append(np.where(leaf, -1, children_right + offset))
+        feature.append(np.where(leaf, 0, np.array(tree["split_indices"])))
+        # Split conditions are float32; leaves keep their margin there
+        conditions = np.array(tree["split_conditions"], dtype=np.float32).astype(float)
+        threshold.append(conditions)
+        value.append(np.where(leaf, conditions, 0.0))
+        default_left.append(np.array(tree["default_left"], dtype=bool))
+        offset += len(children_left)
+    return {
+        "kind": "boosted",
+        "classes": np.asarray(getattr(model, "classes_", [0, 1])),
+        "roots": np.array(roots),
+        "left": np.concatenate(left),
+        "right": np.concatenate(right),
+        "feature": np.concatenate(feature),
+        "threshold": np.concatenate(threshold),
+        "value": np.concatenate(value),
+        "default_left": np.concatenate(default_left),
+        "base_margin": np.log(base_score / (1 - base_score)),
+    }
+
+
+def export_fit_model(model, path, scaler=None):
+    name = type(model).__name__
+    if name == "MLPClassifier":
+        arrays = mlp_arrays(model, scaler)
+    elif name in ("RandomForestClassifier", "ExtraTreesClassifier"):
+        arrays = forest_arrays(model)
+    elif name == "XGBClassifier":
+        arrays = boosted_arrays(model)
+    else:
+        raise ValueError(f"Cannot export a {name}")
+    if scaler is not None and arrays["kind"] != "mlp":
+        raise ValueError("Only the MLP export takes a scaler")
+    # Uncompressed, so the arrays can be read straight from the file
+    np.savez(path, **arrays)
+
+
+def main():
+    import warnings
+    import joblib
+    from sklearn.exceptions import InconsistentVersionWarning
+    warnings.filterwarnings("ignore", category=InconsistentVersionWarning)
+
+    parser = argparse.ArgumentParser(description="Export a fit model to NumPy arrays")
+    parser.add_argument("model", help="joblib .pkl of the trained model")
+    parser.add_argument("output", help=".npz file to write")
+    parser.add_argument("--scaler", help="joblib .pkl of the StandardScaler used with the model")
+    args = parser.parse_args()
+
+    model = joblib.load(args.model)
+    scaler = joblib.load(args.scaler) if args.scaler else None
+    export_fit_model(model, args.output, scaler)
+    print(f"Exported {type(model).__name__} to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+from box_array import BoxArray, find_lattice_position
+from extreme_points import find_extreme_point_position
+from free_space import MaximalSpaceTracker, find_maximal_space_position
+from heightmap_engine import HeightMap, find_heightmap_position
+from jit_kernels import find_jit_lattice_position
+from multires_search import OccupancyPyramid, find_multires_position
+from shelf_packing import ShelfPacker, find_shelf_position, height_class
+from spatial_index import SpatialHashIndex
+from voxel_grid import VoxelGrid, find_voxel_position
+
+
+# ---------- Placement Backends ----------
+# Position searches shared by placement_engine.py and main_api.py. Each one
+# takes (container, used_positions, item) and returns a (start, end) box or
+# None, same as find_free_position. The lattice scan itself stays in the
+# callers under the name "grid".
+
+POSITION_SEARCH = {
+    "extreme_points": find_extreme_point_position,
+    "voxel": find_voxel_position,
+    "heightmap": find_heightmap_position,
+    "maximal_spaces": find_maximal_space_position,
+    "lattice": find_lattice_position,
+    "extreme_points_batched": find_extreme_point_position,
+    "multires": find_multires_position,
+    "grid_jit": find_jit_lattice_position,
+    "shelf": find_shelf_position,
+}
+
+# Searches where failing for an item also rules out every item that is at
+# least as large on each sorted axis. The heightmap backend is left out:
+# a smaller footprint can rest lower and change its support check. The shelf
+# backend is left out too: which slots it tries depends on the order items
+# came in, not only on the free space.
+MONOTONE_SEARCH = {
+    "grid", "extreme_points", "voxel", "maximal_spaces", "lattice",
+    "extreme_points_batched", "multires", "grid_jit",
+}
+
+# Backends that need their own occupancy structure in used_space
+USED_SPACE = {
+    "voxel": VoxelGrid,
+    "heightmap": HeightMap,
+    "maximal_spaces": MaximalSpaceTracker,
+    "lattice": BoxArray,
+    "extreme_points_batched": BoxArray,
+    "multires": OccupancyPyramid,
+    "grid_jit": BoxArray,
+    "shelf": ShelfPacker,
+}
+
+
+def new_used_space(engine, container):
+    if engine in USED_SPACE:
+        return USED_SPACE[engine](container)
+    return SpatialHashIndex()
+
+
+# Sort keys for the order items are placed in: highest priority first. The
+# shelf backend also groups items of one priority by height class, tallest
+# first, so its layers fill with items of similar height.
+def by_priority(item):
+    return -item['priority']
+
+
+def by_priority_then_height_class(item):
+    return -item['priority'], -height_class(item)
+
+
+PLACEMENT_ORDER = {
+    "shelf": by_priority_then_height_class,
+}
+
+
+def placement_order(engine):
+    return PLACEMENT_ORDER.get(engine, by_priority)
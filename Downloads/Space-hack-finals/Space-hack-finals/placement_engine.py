@@ -7,11 +7,16 @@
 import os
 import json
 import pandas as pd
-from itertools import permutations
-import joblib
 from datetime import datetime
-from tensorflow.keras.models import load_model
-import numpy as np
+import placement_backends
+from fit_matrix import cascade_stats
+from numpy_models import load_fit_model
+from shape_memo import rotate_item
+from units import box_to_cm, container_to_mm, item_to_mm, to_mm
+from zone_parallel import UNPLACED_REASONS, FitModel, pack_items, place_by_zone
+from portfolio import ORDERINGS, run_portfolio
+from rearrangement import rearrangement_steps
+from spatial_index import collides
 
 
 # In[4]:
@@ -76,21 +81,6 @@ else:
 # In[6]:
 
 
-def rotate_item(item):
-    dims = (item['width'], item['depth'], item['height'])
-    return list(set(permutations(dims)))
-
-
-def overlaps(pos1, pos2):
-    a_start, a_end = pos1
-    b_start, b_end = pos2
-    return not (
-        a_end[0] <= b_start[0] or a_start[0] >= b_end[0] or
-        a_end[1] <= b_start[1] or a_start[1] >= b_end[1] or
-        a_end[2] <= b_start[2] or a_start[2] >= b_end[2]
-    )
-
-
 def fits_inside(box, container):
     _, end = box
     return (
@@ -103,22 +93,26 @@ def fits_inside(box, container):
 # In[7]:
 
 
+# Geometry is in integer millimetres from here on (see units.py)
+GRID_STEP = to_mm(5)
+
+
 def find_free_position(container, used_positions, item):
     for rotation in rotate_item(item):
-        w, d, h = map(int, rotation)  # Ensure dimensions are integers
-        container_w = int(container['width'])
-        container_d = int(container['depth'])
-        container_h = int(container['height'])
-
-        for x in range(0, container_w - w + 1, 5):
-            for y in range(0, container_d - d + 1, 5):
-                for z in range(0, container_h - h + 1, 5):
+        w, d, h = rotation
+        container_w = container['width']
+        container_d = container['depth']
+        container_h = container['height']
+
+        for x in range(0, container_w - w + 1, GRID_STEP):
+            for y in range(0, container_d - d + 1, GRID_STEP):
+                for z in range(0, container_h - h + 1, GRID_STEP):
                     start = (x, y, z)
                     end = (x + w, y + d, z + h)
                     box = (start, end)
                     
 
-                    if any(overlaps(box, used) for used in used_positions):
+                    if collides(used_positions, box):
                         continue
 
                     if fits_inside(box, container):
@@ -129,77 +123,106 @@ def find_free_position(container, used_positions, item):
     return None
 
 
+class DebugLogged:
+    # A class rather than a closure so the parallel and portfolio modes can
+    # pickle it into their worker processes
+    def __init__(self, find_position):
+        self.find_position = find_position
+
+    def __call__(self, container, used_positions, item):
+        box = self.find_position(container, used_positions, item)
+        if box is None:
+            print(f"[DEBUG] No fit found for item {item['itemId']} in container {container['containerId']}")
+        return box
+
+
+# "grid" is the original 5 cm lattice scan, kept for comparison
+POSITION_SEARCH = {"grid": find_free_position}
+POSITION_SEARCH.update({
+    name: DebugLogged(search)
+    for name, search in placement_backends.POSITION_SEARCH.items()
+})
+
+
 
 # In[10]:
 
 
-import warnings
-from sklearn.exceptions import InconsistentVersionWarning
-warnings.filterwarnings("ignore", category=InconsistentVersionWarning)
-
-
-nn_model = joblib.load("container_fit_nn_model.pkl")
-scaler = joblib.load("container_fit_nn_scaler.pkl")
-
-
-
-def place_items_with_nn(items, containers):
-    placements = []
-    rearrangements = []
-    used_space = {c['containerId']: [] for c in containers}
-
-    items_sorted = sorted(items, key=lambda x: -x['priority'])
-    x=100
-
-    for item in items_sorted:
-        placed = False
-        preferred = [c for c in containers if c['zone'] == item['preferredZone']]
-        fallback = [c for c in containers if c['zone'] != item['preferredZone']]
-        candidate_containers = preferred + fallback
-
-        x-=1.5678
-
-        for container in candidate_containers:
-            features = np.array([[
-                item['width'], item['depth'], item['height'], item['priority'],
-                container['width'], container['depth'], container['height']
-            ]])
-            features_scaled = scaler.transform(features)
-            prediction = nn_model.predict(features_scaled)[0]
-
-            print(f"[INFO] Prediction score for item {item['itemId']} in container {container['containerId']}: {prediction * x:.2f}%")
-
-            # 🌟 Lowered threshold to allow more placements
-            if prediction >= 0.0:
-                box = find_free_position(container, used_space[container['containerId']], item)
-                
-
-                if box:
-                    used_space[container['containerId']].append(box)
-                    placements.append({
-                        "itemId": item['itemId'],
-                        "name": item.get("name", ""),
-                        "containerId": container['containerId'],
-                        "position": {
-                            "startCoordinates": {
-                                "width": box[0][0],
-                                "depth": box[0][1],
-                                "height": box[0][2]
-                            },
-                            "endCoordinates": {
-                                "width": box[1][0],
-                                "depth": box[1][1],
-                                "height": box[1][2]
-                            }
-                        }
-                    })
-                    placed = True
-                    break
-
-        if not placed:
-            print(f"[WARNING] No space or model rejected placement for item {item['itemId']}")
-
-    return placements, rearrangements
+# The NN and its scaler, exported to NumPy arrays (see numpy_models.py)
+nn_model = load_fit_model("container_fit_nn_model.npz")
+
+
+
+
+def placement_entry(item, container_id, box):
+    box = box_to_cm(box)
+    return {
+        "itemId": item['itemId'],
+        "name": item.get("name", ""),
+        "containerId": container_id,
+        "position": {
+            "startCoordinates": {
+                "width": box[0][0],
+                "depth": box[0][1],
+                "height": box[0][2]
+            },
+            "endCoordinates": {
+                "width": box[1][0],
+                "depth": box[1][1],
+                "height": box[1][2]
+            }
+        }
+    }
+
+
+def place_items_with_nn(items, containers, engine="extreme_points", stamp=False, parallel=False,
+                        portfolio=False, rearrange=False):
+    find_position = POSITION_SEARCH[engine]
+    items = [item_to_mm(item) for item in items]
+    containers = [container_to_mm(c) for c in containers]
+    items_sorted = sorted(items, key=placement_backends.placement_order(engine))
+    # Stamping tiles copies without a support check, so it is kept to the
+    # engines without gravity rules
+    stamp = stamp and engine in placement_backends.MONOTONE_SEARCH
+
+    # One worker process per zone, then the overflow in one pass
+    if parallel:
+        placed, _ = place_by_zone(
+            items_sorted, containers, engine, find_position,
+            FitModel(nn_model, threshold=0.0), stamp,
+        )
+        placements = [placement_entry(item, container_id, box) for item, container_id, box in placed]
+        print(f"[INFO] Parallel placement: {len(placements)} of {len(items_sorted)} items placed")
+        return placements, []
+
+    # Every item ordering with this engine, best result kept
+    if portfolio:
+        strategy, placed, _ = run_portfolio(
+            items_sorted, containers, [(ordering, engine) for ordering in ORDERINGS],
+            POSITION_SEARCH, FitModel(nn_model, threshold=0.0), stamp,
+        )
+        placements = [placement_entry(item, container_id, box) for item, container_id, box in placed]
+        print(f"[INFO] Portfolio picked {strategy}: {len(placements)} of {len(items_sorted)} items placed")
+        return placements, []
+
+    # Geometry settles most fit pairs, the rest go through one
+    # nn_model.predict call. With rearrange, items that fit nowhere get a
+    # rearrangement attempt (no gravity engines).
+    reasons = {}
+    steps = []
+    placed, unplaced, _ = pack_items(
+        items_sorted, containers, engine, find_position, FitModel(nn_model, threshold=0.0), stamp,
+        reasons=reasons, rearrange=rearrange, steps=steps,
+    )
+    print(f"[INFO] Fit pairs resolved: {cascade_stats()}")
+    placements = [placement_entry(item, container_id, box) for item, container_id, box in placed]
+    for action, moved, _, _, to_cid, _ in steps:
+        if action == "move":
+            print(f"[INFO] Moved item {moved['itemId']} to container {to_cid} to make room")
+    for item in unplaced:
+        print(f"[WARNING] Item {item['itemId']} not placed: {UNPLACED_REASONS[reasons[item['itemId']]]}")
+    print(f"[INFO] Placement: {len(placements)} of {len(items_sorted)} items placed")
+    return placements, rearrangement_steps(steps)
 
 
 
@@ -0,0 +1,137 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+import placement_backends
+from shelf_packing import height_class
+from zone_parallel import pack_items
+
+
+# ---------- Multi-Start Portfolio ----------
+# The order items are tried in changes how well containers fill. A portfolio
+# runs several strategies, each an (ordering, engine) pair, in worker
+# processes against one shared deadline and keeps the best result: most
+# items placed, then the largest priority-weighted volume. A strategy still
+# running at the deadline stops and competes with what it placed so far.
+# Ties go to the earlier strategy, so the pick does not depend on timing
+# once every strategy has finished.
+#
+# Items and containers are dicts in integer millimetres.
+
+DEFAULT_SECONDS = 30
+# Extra wait past the deadline for a worker to finish its current search
+GRACE_SECONDS = 2
+
+
+def volume(item):
+    return item['width'] * item['depth'] * item['height']
+
+
+def by_priority(item):
+    return -item['priority']
+
+
+def by_priority_then_volume(item):
+    return -item['priority'], -volume(item)
+
+
+def by_volume(item):
+    return -volume(item), -item['priority']
+
+
+def by_longest_edge(item):
+    return -max(item['width'], item['depth'], item['height']), -volume(item), -item['priority']
+
+
+def by_height_class(item):
+    # Shortest side first, in 5 cm classes, so shelf layers fill with items
+    # of similar height
+    return -height_class(item), -item['priority']
+
+
+ORDERINGS = {
+    "priority": by_priority,
+    "priority_volume": by_priority_then_volume,
+    "volume": by_volume,
+    "longest_edge": by_longest_edge,
+    "height_class": by_height_class,
+}
+
+
+def score(placed):
+    return len(placed), sum(item['priority'] * volume(item) for item, _, _ in placed)
+
+
+# Set once per worker, so the model is not pickled again for every strategy
+_worker_fits = None
+
+
+def _init_worker(fits):
+    global _worker_fits
+    _worker_fits = fits
+
+
+def _run_strategy(args):
+    ordering, engine, find_position, items, containers, stamp, deadline = args
+    items_sorted = sorted(items, key=ORDERINGS[ordering])
+    # Stamping has no support check, so gravity engines never stamp
+    stamp = stamp and engine in placement_backends.MONOTONE_SEARCH
+    reasons = {}
+    placed, _, _ = pack_items(
+        items_sorted, containers, engine, find_position, _worker_fits, stamp,
+        deadline=deadline, reasons=reasons,
+    )
+    out_of_time = "deadline" in reasons.values()
+    return [(item['itemId'], cid, box) for item, cid, box in placed], out_of_time
+
+
+def run_portfolio(items, containers, strategies, searches, fits, stamp=False,
+                  seconds=DEFAULT_SECONDS, workers=None, timed_out=None):
+    # strategies: (ordering, engine) pairs; searches maps engine names to
+    # position searches. Returns the winning strategy (None if nothing
+    # finished), its (item, containerId, box) placements and the used_space
+    # structures holding them. Failed strategies are logged and skipped; if
+    # none produced a result, the first error is raised. A `timed_out` list
+    # passed in gets the strategies the deadline cut short; with more time
+    # any of them could have won.
+    timed_out = [] if timed_out is None else timed_out
+    deadline = time.time() + seconds
+    tasks = [
+        (ordering, engine, searches[engine], items, containers, stamp, deadline)
+        for ordering, engine in strategies
+    ]
+    workers = min(workers or os.cpu_count() or 1, len(tasks)) or 1
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(fits,))
+    futures = [pool.submit(_run_strategy, task) for task in tasks]
+    done, _ = wait(futures, timeout=seconds + GRACE_SECONDS)
+    pool.shutdown(wait=False, cancel_futures=True)
+
+    items_by_id = {item['itemId']: item for item in items}
+    best = None
+    failed = []
+    for strategy, future in zip(strategies, futures):
+        if future not in done:
+            timed_out.append(strategy)
+            continue
+        error = future.exception()
+        if error is not None:
+            print(f"[WARNING] Portfolio strategy {strategy} failed: {error!r}")
+            failed.append(error)
+            continue
+        placements, out_of_time = future.result()
+        if out_of_time:
+            timed_out.append(strategy)
+        placed = [(items_by_id[item_id], cid, box) for item_id, cid, box in placements]
+        if best is None or score(placed) > score(best[1]):
+            best = (strategy, placed)
+    if best is None:
+        # An empty result is only an answer when nothing went wrong
+        if failed:
+            raise failed[0]
+        return None, [], {}
+
+    strategy, placed = best
+    engine = strategy[1]
+    used_space = {c['containerId']: placement_backends.new_used_space(engine, c) for c in containers}
+    for _, cid, box in placed:
+        used_space[cid].append(box)
+    return strategy, placed, used_space
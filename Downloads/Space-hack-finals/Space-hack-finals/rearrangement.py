@@ -0,0 +1,237 @@
+import heapq
+from collections import defaultdict
+import numpy as np
+from container_index import dominates
+from shape_memo import rotate_item, sorted_dims
+from spatial_index import overlaps
+from units import box_to_cm
+
+
+# ---------- Rearrangement Planner ----------
+# When an item fits nowhere, look for a few items that could move from one
+# container to another to make room for it. In every container large enough
+# for the item, each spot at the origin or at a corner of a placed box is
+# blocked by some set of placed items. Those sets are tried best-first,
+# cheapest first: fewer moves, then lower priority, then less volume moved.
+# Every blocker needs a free spot in another container (its relocation).
+# Only blockers of the item's priority or lower are moved, and a blocker
+# sitting in its preferred zone only leaves that zone for an item of
+# strictly higher priority; otherwise its relocation stays in the zone.
+#
+# Searches are bounded by MAX_MOVES per plan, MAX_EXPANSIONS sets tried per
+# item and a run-wide budget (RUN_BUDGET) on the costly steps: scanning a
+# container for blocked spots and searching for a relocation each cost one.
+# Once the budget is spent every plan() returns None. Plans are applied in
+# place. The moves are kept in `steps` for the rearrangements list, and the
+# item's own box is left for the caller to place.
+#
+# Between plans boxes are only added, and with a monotone search a spot
+# that was not there does not appear. So a relocation found in container C
+# stays valid until C changes, a relocation that found nothing stays valid,
+# and a plan that failed fails again for the same shape until some
+# container changes. Applying a plan frees space and drops all of these.
+#
+# Moving boxes out from under others is only sound without gravity, so the
+# callers only plan for engines in placement_backends.MONOTONE_SEARCH.
+
+MAX_MOVES = 2
+MAX_EXPANSIONS = 16
+RUN_BUDGET = 1000
+
+
+def volume(obj):
+    return obj['width'] * obj['depth'] * obj['height']
+
+
+class RearrangementPlanner:
+    def __init__(self, containers, used_space, container_index, find_position, memo=None,
+                 budget=RUN_BUDGET):
+        self.containers = {c['containerId']: c for c in containers}
+        self.order = [c['containerId'] for c in containers]
+        self.used_space = used_space
+        self.container_index = container_index
+        self.find_position = find_position
+        self.memo = memo
+        self.contents = defaultdict(dict)
+        self.relocations = {}
+        # Relocation keys whose cached spot is in each container
+        self.relocated_into = defaultdict(set)
+        self.failed_plans = set()
+        self.budget = budget
+        self.steps = []
+
+    def record(self, cid, item, box):
+        # Called after every placement
+        self.contents[cid][item['itemId']] = (item, box)
+        for key in self.relocated_into.pop(cid, ()):
+            self.relocations.pop(key, None)
+        self.failed_plans.clear()
+
+    def forget(self):
+        self.relocations.clear()
+        self.relocated_into.clear()
+        self.failed_plans.clear()
+
+    def kept_zone(self, moved, source, item):
+        # The zone `moved` has to stay in when it makes room for `item`
+        in_preferred = self.containers[source]['zone'] == moved['preferredZone']
+        if in_preferred and moved['priority'] >= item['priority']:
+            return moved['preferredZone']
+        return None
+
+    def relocation(self, item, source, zone=None):
+        # With `zone`, only containers in that zone are tried
+        key = (item['itemId'], zone)
+        if key not in self.relocations:
+            self.budget -= 1
+            self.relocations[key] = None
+            for cid in self.container_index.candidates(item):
+                if zone is not None and self.containers[cid]['zone'] != zone:
+                    # Candidates come preferred zone first
+                    break
+                if cid == source:
+                    continue
+                box = self.find_position(self.containers[cid], self.used_space[cid], item)
+                if box:
+                    self.relocations[key] = (cid, box)
+                    self.relocated_into[cid].add(key)
+                    break
+        return self.relocations[key]
+
+    def targets(self, item):
+        dims = sorted_dims(item)
+        fitting = [cid for cid in self.order if dominates(dims, sorted_dims(self.containers[cid]))]
+        return sorted(fitting, key=lambda cid: self.containers[cid]['zone'] != item['preferredZone'])
+
+    def regions(self, target, item):
+        # Every spot for the item at the origin or at a corner of a placed
+        # box, with the placed items it overlaps (its blockers). Spots that
+        # are free, or need more than MAX_MOVES moves, are dropped.
+        entries = list(self.contents[target].values())
+        if not entries:
+            return []
+        container = self.containers[target]
+        placed = np.array([(*box[0], *box[1]) for _, box in entries])
+        anchors = np.unique(np.vstack([
+            np.zeros((1, 3), dtype=placed.dtype), placed[:, :3],
+            np.column_stack([placed[:, 3], placed[:, 1], placed[:, 2]]),
+            np.column_stack([placed[:, 0], placed[:, 4], placed[:, 2]]),
+            np.column_stack([placed[:, 0], placed[:, 1], placed[:, 5]]),
+        ]), axis=0)
+        found = []
+        for rotation in rotate_item(item):
+            ends = anchors + rotation
+            inside = (ends <= (container['width'], container['depth'], container['height'])).all(axis=1)
+            candidates = np.hstack([anchors[inside], ends[inside]])
+            hit = (
+                (candidates[:, None, 3] > placed[None, :, 0]) & (candidates[:, None, 0] < placed[None, :, 3]) &
+                (candidates[:, None, 4] > placed[None, :, 1]) & (candidates[:, None, 1] < placed[None, :, 4]) &
+                (candidates[:, None, 5] > placed[None, :, 2]) & (candidates[:, None, 2] < placed[None, :, 5])
+            )
+            counts = hit.sum(axis=1)
+            for row in np.flatnonzero((counts > 0) & (counts <= MAX_MOVES)):
+                blockers = [entries[j] for j in np.flatnonzero(hit[row])]
+                region = candidates[row].tolist()
+                found.append((blockers, (tuple(region[:3]), tuple(region[3:]))))
+        return found
+
+    def plan(self, item, allowed=None):
+        # Returns (containerId, box, moves) with the moves already applied,
+        # or None. `allowed(container)` can veto target containers.
+        if self.budget <= 0 or self.container_index.free_volume < volume(item):
+            return None
+        targets = [
+            target for target in self.targets(item)
+            if allowed is None or allowed(self.containers[target])
+        ]
+        # Which blockers may move depends on the item's priority too
+        shape = (sorted_dims(item), item['priority'], tuple(targets))
+        if shape in self.failed_plans:
+            return None
+        heap = []
+        for target in targets:
+            if self.budget <= 0:
+                return None
+            self.budget -= 1
+            seen = set()
+            for blockers, region in self.regions(target, item):
+                ids = frozenset(moved['itemId'] for moved, _ in blockers)
+                if ids in seen:
+                    continue
+                seen.add(ids)
+                if any(moved['priority'] > item['priority'] for moved, _ in blockers):
+                    continue
+                cost = (len(blockers), sum(moved['priority'] for moved, _ in blockers),
+                        sum(volume(moved) for moved, _ in blockers))
+                heap.append((cost, len(heap), target, region, blockers))
+        heapq.heapify(heap)
+        for _ in range(MAX_EXPANSIONS):
+            if not heap or self.budget <= 0:
+                break
+            _, _, target, region, blockers = heapq.heappop(heap)
+            if all(self.relocation(moved, target, self.kept_zone(moved, target, item)) for moved, _ in blockers):
+                result = self.try_moves(target, blockers, item, region)
+                if result:
+                    return result
+        self.failed_plans.add(shape)
+        return None
+
+    def try_moves(self, target, entries, item, region):
+        # Boxes the planner was not told about can still be in the way.
+        # Checked before anything moves: removing a box can be costly.
+        blocking = {box for _, box in entries}
+        if any(overlaps(region, other) for other in self.used_space[target] if other not in blocking):
+            return None
+        applied = []
+        for moved, box in entries:
+            to_cid, to_box = self.relocation(moved, target, self.kept_zone(moved, target, item))
+            if any(cid == to_cid and overlaps(to_box, other) for cid, _, _, other in applied):
+                # An earlier move of this plan took the cached spot
+                to_box = self.find_position(self.containers[to_cid], self.used_space[to_cid], moved)
+            if not to_box:
+                for cid, _, _, other in reversed(applied):
+                    self.used_space[cid].remove(other)
+                return None
+            self.used_space[to_cid].append(to_box)
+            applied.append((to_cid, moved, box, to_box))
+
+        for to_cid, moved, from_box, to_box in applied:
+            self.used_space[target].remove(from_box)
+            self.container_index.release(target, from_box, self.used_space[target])
+            self.container_index.record(to_cid, to_box, self.used_space[to_cid])
+            del self.contents[target][moved['itemId']]
+            self.contents[to_cid][moved['itemId']] = (moved, to_box)
+            self.steps.append(("move", moved, target, from_box, to_cid, to_box))
+            if self.memo is not None:
+                self.memo.changed(to_cid)
+        if self.memo is not None:
+            self.memo.changed(target)
+        self.forget()
+        self.steps.append(("place", item, None, None, target, region))
+        return target, region, [(moved, target, from_box, to_cid, to_box) for to_cid, moved, from_box, to_box in applied]
+
+
+def position_of(box):
+    if box is None:
+        return None
+    start, end = box_to_cm(box)
+    return {
+        "startCoordinates": {"width": start[0], "depth": start[1], "height": start[2]},
+        "endCoordinates": {"width": end[0], "depth": end[1], "height": end[2]},
+    }
+
+
+def rearrangement_steps(steps):
+    # Planner steps in the rearrangements format of /api/placement
+    return [
+        {
+            "step": n,
+            "action": action,
+            "itemId": item['itemId'],
+            "fromContainer": from_cid,
+            "fromPosition": position_of(from_box),
+            "toContainer": to_cid,
+            "toPosition": position_of(to_box),
+        }
+        for n, (action, item, from_cid, from_box, to_cid, to_box) in enumerate(steps, start=1)
+    ]
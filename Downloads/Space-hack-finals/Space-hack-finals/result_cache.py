@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+# ---------- Placement Result Cache ----------
+# Results of /api/placement keyed by a hash of the canonical request, so a
+# manifest that is submitted again is answered without re-running placement.
+# A value is the JSON response body (bytes) and the stored arrangement,
+# {itemId: (containerId, box)}. The memory tier is an LRU bounded by entry
+# count and by total encoded size. With a directory set, entries are also
+# written to disk (one JSON file per key, oldest dropped past
+# max_disk_bytes) and survive restarts; a disk hit is promoted back into
+# memory. Disk entries are plain JSON, never pickles, so a file dropped
+# into the directory cannot run code when it is read.
+#
+# Bump CACHE_VERSION whenever placement output changes for the same input
+# (new model, search changes), so old disk entries stop matching.
+
+CACHE_VERSION = 5
+
+
+def canonical_key(payload):
+    text = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(f"{CACHE_VERSION}:{text}".encode()).hexdigest()
+
+
+def encode(value):
+    body, locations = value
+    return json.dumps({
+        "body": body.decode(),
+        "locations": {
+            item_id: [cid, [[int(v) for v in start], [int(v) for v in end]]]
+            for item_id, (cid, (start, end)) in locations.items()
+        },
+    }, separators=(",", ":")).encode()
+
+
+def decode(blob):
+    data = json.loads(blob)
+    locations = {
+        item_id: (cid, (tuple(start), tuple(end)))
+        for item_id, (cid, (start, end)) in data["locations"].items()
+    }
+    return data["body"].encode(), locations
+
+
+class ResultCache:
+    def __init__(self, max_entries=256, max_bytes=64 * 2**20, directory=None, max_disk_bytes=512 * 2**20):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.disk_lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key][0]
+        value = self._load(key)
+        with self.lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self._remember(key, value, len(encode(value)))
+        return value
+
+    def put(self, key, value):
+        blob = encode(value)
+        self._remember(key, value, len(blob))
+        if self.directory:
+            with self.disk_lock:
+                self._save(key, blob)
+
+    def _remember(self, key, value, size):
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.total_bytes -= self.entries.pop(key)[1]
+            self.entries[key] = (value, size)
+            self.total_bytes += size
+            while len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.total_bytes -= evicted
+
+    def _load(self, key):
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), "rb") as f:
+                return decode(f.read())
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _save(self, key, blob):
+        # Write then rename, so a crash never leaves a half-written entry
+        path = self._path(key)
+        with open(path + ".tmp", "wb") as f:
+            f.write(blob)
+        os.replace(path + ".tmp", path)
+        files = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(".json")]
+        files.sort(key=os.path.getmtime)
+        total = sum(os.path.getsize(name) for name in files)
+        while files and total > self.max_disk_bytes:
+            oldest = files.pop(0)
+            total -= os.path.getsize(oldest)
+            os.remove(oldest)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "diskHits": self.disk_hits,
+                "misses": self.misses,
+                "entries": len(self.entries),
+                "bytes": self.total_bytes,
+            }
@@ -0,0 +1,61 @@
+from collections import defaultdict
+from functools import lru_cache
+from itertools import permutations
+
+
+# ---------- Shape-Class Memoization ----------
+# Most items share a handful of shapes and containers come in a few sizes,
+# so a placement run keeps repeating the same work: building rotation lists
+# and running the same position search against containers in the same
+# state. (Fit-model answers are batched up front instead, see fit_matrix.)
+#
+# Search results are keyed by (sorted item dims, container shape, occupancy
+# version). Every empty container of one shape is in the same state, so they
+# share the version None; once a container holds boxes its version is
+# (containerId, number of changes), bumped by changed() after every append
+# or remove. A memo lives for one placement run.
+
+@lru_cache(maxsize=None)
+def rotations(dims):
+    return tuple(set(permutations(dims)))
+
+
+def rotate_item(item):
+    return rotations((item['width'], item['depth'], item['height']))
+
+
+def sorted_dims(obj):
+    return tuple(sorted((obj['width'], obj['depth'], obj['height'])))
+
+
+def container_shape(container):
+    return (container['width'], container['depth'], container['height'])
+
+
+class ShapeMemo:
+    def __init__(self):
+        self.versions = defaultdict(int)
+        self.searches = {}
+        self.hits = 0
+        self.misses = 0
+
+    def changed(self, cid):
+        self.versions[cid] += 1
+
+    def occupancy_version(self, cid, used_positions):
+        if len(used_positions) == 0:
+            return None
+        return (cid, self.versions[cid])
+
+    def find(self, find_position, container, used_positions, item):
+        key = (
+            sorted_dims(item), container_shape(container),
+            self.occupancy_version(container['containerId'], used_positions),
+        )
+        if key in self.searches:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self.searches[key] = find_position(container, used_positions, item)
+        # Any rotation of the item fits the cached box, so it is reused as is
+        return self.searches[key]
@@ -0,0 +1,131 @@
+from shape_memo import rotate_item
+from spatial_index import SpatialHashIndex
+from units import to_mm
+
+
+# ---------- Shelf / Guillotine Packing ----------
+# Each container is filled in horizontal layers stacked from the floor. A
+# layer is split front to back into shelves, and items sit side by side
+# along a shelf. An item only ever goes to the end of a shelf, a new shelf
+# at the back of a layer, or a new layer on top, so a search looks at a few
+# slots per layer instead of scanning positions. Every cut runs wall to
+# wall, like a guillotine.
+#
+# Fast but less dense: space beside a short item in a tall layer is lost.
+# Layers fill best with items of similar height, so the callers visit shelf
+# items by height class within each priority band (see
+# placement_backends.placement_order), and the portfolio also tries a pure
+# height-class order (portfolio.ORDERINGS["height_class"]).
+#
+# Boxes placed by something other than this search (stamped copies,
+# rearrangements, restored arrangements) are stored all the same, and every
+# slot is checked against the stored boxes before it is used.
+#
+# Like SpatialHashIndex it stands in for the list kept in
+# used_space[containerId] (append / remove / iteration / len).
+
+HEIGHT_CLASS = to_mm(5)
+
+
+def height_class(item):
+    # Shortest side in 5 cm classes: the height an item lies at
+    return min(item['width'], item['depth'], item['height']) // HEIGHT_CLASS
+
+class Layer:
+    def __init__(self, z, height):
+        self.z = z
+        self.height = height
+        self.depth_used = 0
+        # [y, depth, end of the last item along width]
+        self.shelves = []
+
+    def shelf_at(self, y):
+        for shelf in self.shelves:
+            if shelf[0] == y:
+                return shelf
+        return None
+
+
+class ShelfPacker:
+    def __init__(self, container):
+        self.size = (container['width'], container['depth'], container['height'])
+        self.layers = []
+        self.top = 0
+        self.index = SpatialHashIndex()
+
+    def layer_at(self, z):
+        for layer in self.layers:
+            if layer.z == z:
+                return layer
+        return None
+
+    def append(self, box):
+        self.index.append(box)
+        (x0, y0, z0), (x1, y1, z1) = box
+        layer = self.layer_at(z0)
+        if layer is None:
+            if z0 < self.top:
+                return
+            layer = Layer(z0, z1 - z0)
+            self.layers.append(layer)
+        elif z1 > layer.z + layer.height and layer is self.layers[-1]:
+            layer.height = z1 - z0
+        self.top = max(self.top, layer.z + layer.height)
+
+        shelf = layer.shelf_at(y0)
+        if shelf is None:
+            if y0 < layer.depth_used:
+                return
+            shelf = [y0, y1 - y0, 0]
+            layer.shelves.append(shelf)
+        elif y1 > shelf[0] + shelf[1] and shelf is layer.shelves[-1]:
+            shelf[1] = y1 - y0
+        layer.depth_used = max(layer.depth_used, shelf[0] + shelf[1])
+        shelf[2] = max(shelf[2], x1)
+
+    def remove(self, box):
+        self.index.remove(box)
+        (x0, y0, z0), (x1, _, _) = box
+        # Only the last item of a shelf gives its space back
+        layer = self.layer_at(z0)
+        shelf = layer.shelf_at(y0) if layer else None
+        if shelf and shelf[2] == x1:
+            shelf[2] = x0
+
+    def intersects(self, box):
+        return self.index.intersects(box)
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def slots(self, item):
+        # Candidate boxes in the order they are tried: ends of existing
+        # shelves, then a new shelf in each layer, then a new layer
+        W, D, H = self.size
+        dims = rotate_item(item)
+        for layer in self.layers:
+            for y, depth, end in layer.shelves:
+                fitting = [r for r in dims if end + r[0] <= W and r[1] <= depth and r[2] <= layer.height]
+                if fitting:
+                    w, d, h = min(fitting)
+                    yield (end, y, layer.z), (end + w, y + d, layer.z + h)
+        for layer in self.layers:
+            fitting = [r for r in dims if r[0] <= W and layer.depth_used + r[1] <= D and r[2] <= layer.height]
+            if fitting:
+                w, d, h = min(fitting, key=lambda r: (r[1], r[0]))
+                y = layer.depth_used
+                yield (0, y, layer.z), (w, y + d, layer.z + h)
+        fitting = [r for r in dims if r[0] <= W and r[1] <= D and self.top + r[2] <= H]
+        if fitting:
+            w, d, h = min(fitting, key=lambda r: (r[2], r[1], r[0]))
+            yield (0, 0, self.top), (w, d, self.top + h)
+
+
+def find_shelf_position(container, used_positions, item):
+    for box in used_positions.slots(item):
+        if not used_positions.intersects(box):
+            return box
+    return None
@@ -0,0 +1,102 @@
+from collections import defaultdict
+from units import to_mm
+
+
+# ---------- Spatial Hash Index ----------
+# Per-container uniform-grid hash of placed boxes. Each box is registered in
+# every cell its extent touches, so a query only looks at boxes that share a
+# cell with the query box instead of every box in the container.
+#
+# It behaves like the plain list previously kept in used_space[containerId]
+# (append / remove / iteration / len), so existing callers keep working.
+
+DEFAULT_CELL_SIZE = to_mm(50)
+
+
+def overlaps(pos1, pos2):
+    a_start, a_end = pos1
+    b_start, b_end = pos2
+    return not (
+        a_end[0] <= b_start[0] or a_start[0] >= b_end[0] or
+        a_end[1] <= b_start[1] or a_start[1] >= b_end[1] or
+        a_end[2] <= b_start[2] or a_start[2] >= b_end[2]
+    )
+
+
+class SpatialHashIndex:
+    def __init__(self, cell_size=DEFAULT_CELL_SIZE):
+        self.cell_size = cell_size
+        self.boxes = {}
+        self.cells = defaultdict(set)
+        self._next_id = 0
+
+    def _cell_range(self, box):
+        (x0, y0, z0), (x1, y1, z1) = box
+        size = self.cell_size
+        # End coordinates are exclusive, so a box ending exactly on a cell
+        # boundary does not spill into the next cell
+        cx0, cy0, cz0 = x0 // size, y0 // size, z0 // size
+        cx1 = max(cx0, -(-x1 // size) - 1)
+        cy1 = max(cy0, -(-y1 // size) - 1)
+        cz1 = max(cz0, -(-z1 // size) - 1)
+        return [
+            (cx, cy, cz)
+            for cx in range(cx0, cx1 + 1)
+            for cy in range(cy0, cy1 + 1)
+            for cz in range(cz0, cz1 + 1)
+        ]
+
+    def append(self, box):
+        box_id = self._next_id
+        self._next_id += 1
+        self.boxes[box_id] = box
+        for cell in self._cell_range(box):
+            self.cells[cell].add(box_id)
+
+    def remove(self, box):
+        for box_id, stored in self.boxes.items():
+            if stored == box:
+                break
+        else:
+            raise ValueError(f"{box} is not in the index")
+        del self.boxes[box_id]
+        for cell in self._cell_range(box):
+            bucket = self.cells[cell]
+            bucket.discard(box_id)
+            if not bucket:
+                del self.cells[cell]
+
+    def query(self, box):
+        found = set()
+        for cell in self._cell_range(box):
+            bucket = self.cells.get(cell)
+            if bucket:
+                found.update(bucket)
+        return [self.boxes[box_id] for box_id in found]
+
+    def intersects(self, box):
+        # Stops at the first hit; a box spanning several cells may be
+        # checked more than once, which is cheaper than de-duplicating
+        cells = self.cells
+        boxes = self.boxes
+        for cell in self._cell_range(box):
+            bucket = cells.get(cell)
+            if bucket:
+                for box_id in bucket:
+                    if overlaps(box, boxes[box_id]):
+                        return True
+        return False
+
+    def __iter__(self):
+        return iter(list(self.boxes.values()))
+
+    def __len__(self):
+        return len(self.boxes)
+
+
+def collides(used_positions, box):
+    # Indexed structures (SpatialHashIndex, BoxArray) answer directly;
+    # plain lists are still accepted and fall back to a linear scan
+    if hasattr(used_positions, "intersects"):
+        return used_positions.intersects(box)
+    return any(overlaps(box, used) for used in used_positions)
@@ -0,0 +1,46 @@
+from itertools import takewhile
+from spatial_index import collides
+
+
+# ---------- Stamp Placement ----------
+# Bulk cargo often has many copies of the same item. Items with the same
+# sorted dimensions, priority and preferred zone are copies of each other.
+# Once one of them is placed, the copies right after it in placement order
+# are stamped next to it by tiling the same box along width, then depth,
+# then height. Each copy only needs a collision check, not a position
+# search. Copies further down the order are not pulled forward, so stamping
+# never takes space from an item that would have been placed before them.
+# Every stamped copy is still reported as its own placement.
+
+def group_key(item):
+    dims = tuple(sorted((item['width'], item['depth'], item['height'])))
+    return dims, item['priority'], item['preferredZone']
+
+
+def identical_run(items_sorted, i):
+    # The copies of items_sorted[i] that directly follow it
+    key = group_key(items_sorted[i])
+    return list(takewhile(lambda other: group_key(other) == key, items_sorted[i + 1:]))
+
+
+def stamp_copies(container, used_positions, box, count):
+    # Up to `count` free boxes tiled from `box`, in the container and not
+    # colliding with anything already placed
+    (x0, y0, z0), (x1, y1, z1) = box
+    w, d, h = x1 - x0, y1 - y0, z1 - z0
+    nx = int((container['width'] - x0) // w)
+    ny = int((container['depth'] - y0) // d)
+    nz = int((container['height'] - z0) // h)
+    copies = []
+    for k in range(nz):
+        for j in range(ny):
+            for i in range(nx):
+                if len(copies) == count:
+                    return copies
+                if i == j == k == 0:
+                    continue
+                x, y, z = x0 + i * w, y0 + j * d, z0 + k * h
+                candidate = ((x, y, z), (x + w, y + d, z + h))
+                if not collides(used_positions, candidate):
+                    copies.append(candidate)
+    return copies
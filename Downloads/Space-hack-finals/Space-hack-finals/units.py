@@ -0,0 +1,61 @@
+import math
+
+
+# ---------- Fixed-Point Units ----------
+# Items and containers arrive in centimetres (floats in the CSVs and API).
+# They are converted once, on ingest, to integer millimetres. Every
+# placement structure, comparison and stored box then works on exact
+# integers. Coordinates are converted back to centimetres only when
+# placements are reported.
+#
+# Sizes that are not whole millimetres are rounded so nothing is placed
+# that would not fit in centimetres: items round up and containers round
+# down. Float noise below a micrometre (10.1 stored as 10.099999...) is
+# ignored first, so exact millimetre values stay exact.
+
+MM_PER_CM = 10
+
+# Box arrays never need more than int32: 2**31 mm is over 2000 km
+COORD_DTYPE = "int32"
+
+
+def to_mm(cm):
+    return int(round(float(cm) * MM_PER_CM))
+
+
+def to_mm_up(cm):
+    return math.ceil(round(float(cm) * MM_PER_CM, 3))
+
+
+def to_mm_down(cm):
+    return math.floor(round(float(cm) * MM_PER_CM, 3))
+
+
+def to_cm(mm):
+    # Whole centimetres stay ints so existing outputs keep their format
+    if mm % MM_PER_CM == 0:
+        return int(mm) // MM_PER_CM
+    return mm / MM_PER_CM
+
+
+def item_to_mm(item):
+    return {
+        **item,
+        'width': to_mm_up(item['width']),
+        'depth': to_mm_up(item['depth']),
+        'height': to_mm_up(item['height']),
+    }
+
+
+def container_to_mm(container):
+    return {
+        **container,
+        'width': to_mm_down(container['width']),
+        'depth': to_mm_down(container['depth']),
+        'height': to_mm_down(container['height']),
+    }
+
+
+def box_to_cm(box):
+    start, end = box
+    return tuple(to_cm(v) for v in start), tuple(to_cm(v) for v in end)
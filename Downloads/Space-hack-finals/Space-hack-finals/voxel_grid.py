@@ -0,0 +1,119 @@
+from shape_memo import rotate_item
+import numpy as np
+from units import to_mm
+
+
+# ---------- Voxel Occupancy Grid ----------
+# Each container is split into cubic voxels of `resolution` mm. Placed boxes
+# mark every voxel they touch, and a 3D summed-area table over the occupancy
+# array answers "is this box empty?" with eight lookups. Checking every origin
+# for a rotation at once is a single vectorized inclusion-exclusion pass.
+#
+# Like SpatialHashIndex it stands in for the list kept in
+# used_space[containerId] (append / remove / iteration / len).
+
+DEFAULT_RESOLUTION = to_mm(5)
+
+
+class VoxelGrid:
+    def __init__(self, container, resolution=DEFAULT_RESOLUTION):
+        self.resolution = resolution
+        # Partial voxels at the far walls are left out, so anything found
+        # here is guaranteed to fit inside the container
+        self.shape = (
+            int(container['width'] // resolution),
+            int(container['depth'] // resolution),
+            int(container['height'] // resolution),
+        )
+        self.occupied = np.zeros(self.shape, dtype=bool)
+        self.boxes = []
+        self._sums = None
+
+    def _voxel_span(self, box):
+        start, end = box
+        res = self.resolution
+        return tuple(
+            slice(max(s // res, 0), min(-(-e // res), n))
+            for s, e, n in zip(start, end, self.shape)
+        )
+
+    def append(self, box):
+        self.boxes.append(box)
+        self.occupied[self._voxel_span(box)] = True
+        self._sums = None
+
+    def remove(self, box):
+        self.boxes.remove(box)
+        # Voxels can be shared by neighbouring boxes, so re-mark the rest
+        self.occupied[:] = False
+        for other in self.boxes:
+            self.occupied[self._voxel_span(other)] = True
+        self._sums = None
+
+    def __iter__(self):
+        return iter(self.boxes)
+
+    def __len__(self):
+        return len(self.boxes)
+
+    @property
+    def sums(self):
+        if self._sums is None:
+            self._sums = summed_area(self.occupied)
+        return self._sums
+
+    def is_free(self, i, j, k, a, b, c):
+        # Voxel origin (i, j, k) and extent (a, b, c), in voxels; the origin
+        # may also be given as index arrays to test many origins at once
+        s = self.sums
+        filled = (
+            s[i + a, j + b, k + c]
+            - s[i, j + b, k + c] - s[i + a, j, k + c] - s[i + a, j + b, k]
+            + s[i, j, k + c] + s[i, j + b, k] + s[i + a, j, k]
+            - s[i, j, k]
+        )
+        return filled == 0
+
+    def free_origins(self, a, b, c):
+        return empty_origins(self.sums, a, b, c)
+
+
+def summed_area(occupied):
+    nx, ny, nz = occupied.shape
+    sums = np.zeros((nx + 1, ny + 1, nz + 1), dtype=np.int32)
+    sums[1:, 1:, 1:] = occupied.cumsum(0).cumsum(1).cumsum(2)
+    return sums
+
+
+def empty_origins(sums, a, b, c):
+    # Boolean (nx-a+1, ny-b+1, nz-c+1) array: True where an a x b x c
+    # voxel block starting there is completely empty
+    nx, ny, nz = (n - 1 for n in sums.shape)
+    if a > nx or b > ny or c > nz:
+        return np.zeros((0, 0, 0), dtype=bool)
+    s = sums
+    x0, x1 = slice(0, nx - a + 1), slice(a, nx + 1)
+    y0, y1 = slice(0, ny - b + 1), slice(b, ny + 1)
+    z0, z1 = slice(0, nz - c + 1), slice(c, nz + 1)
+    filled = (
+        s[x1, y1, z1]
+        - s[x0, y1, z1] - s[x1, y0, z1] - s[x1, y1, z0]
+        + s[x0, y0, z1] + s[x0, y1, z0] + s[x1, y0, z0]
+        - s[x0, y0, z0]
+    )
+    return filled == 0
+
+
+def find_voxel_position(container, used_positions, item):
+    grid = used_positions
+    res = grid.resolution
+    for rotation in rotate_item(item):
+        w, d, h = rotation
+        free = grid.free_origins(-(-w // res), -(-d // res), -(-h // res))
+        hits = np.flatnonzero(free)
+        if hits.size:
+            # C order matches the lattice scan: width, then depth, then height
+            i, j, k = np.unravel_index(hits[0], free.shape)
+            x, y, z = int(i) * res, int(j) * res, int(k) * res
+            return ((x, y, z), (x + w, y + d, z + h))
+    return None
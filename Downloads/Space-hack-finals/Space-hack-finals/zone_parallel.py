@@ -0,0 +1,227 @@
+import os
+import time
+from itertools import takewhile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import placement_backends
+from container_index import ContainerIndex
+from fit_matrix import FitMatrix
+from rearrangement import RearrangementPlanner
+from shape_memo import ShapeMemo
+from stamp_placement import identical_run, stamp_copies
+
+
+# ---------- Zone-Parallel Placement ----------
+# Zones never share containers, so the items preferring one zone can be
+# packed into that zone's containers without looking at any other zone.
+# place_by_zone() packs every zone in its own worker process, then places
+# the overflow (items their zone had no room for, and items preferring a
+# zone with no containers) into the other zones in one sequential pass, in
+# placement order. Workers only ever see their own zone, and results are
+# merged in container order, so the outcome does not depend on timing.
+#
+# Unlike the sequential loop, an item always gets its own zone before any
+# overflow from other zones does.
+#
+# Items and containers are dicts in integer millimetres.
+
+class FitModel:
+    # Picklable fit check handed to the workers: the model's prediction for
+    # the cm features (see fit_matrix), accepted when it reaches `threshold`
+    def __init__(self, model, scaler=None, threshold=1):
+        self.model = model
+        self.scaler = scaler
+        self.threshold = threshold
+
+    def scores(self, rows):
+        # One transform and one predict call for any number of rows
+        rows = np.asarray(rows, dtype=float)
+        if self.scaler is not None:
+            rows = self.scaler.transform(rows)
+        return self.model.predict(rows)
+
+    def __call__(self, features):
+        return self.scores([features])[0] >= self.threshold
+
+
+# Why pack_items left an item unplaced
+UNPLACED_REASONS = {
+    "no_container": "no container is large enough or has room left for it",
+    "model_rejected": "the fit model rejected every candidate container",
+    "no_space": "no free position in any candidate container",
+    "containers_full": "every container was too full for the remaining items",
+    "deadline": "not reached before the deadline",
+}
+
+
+def smallest_volume_left(items_sorted):
+    smallest_left = [float("inf")] * (len(items_sorted) + 1)
+    for i in range(len(items_sorted) - 1, -1, -1):
+        item = items_sorted[i]
+        smallest_left[i] = min(item['width'] * item['depth'] * item['height'], smallest_left[i + 1])
+    return smallest_left
+
+
+def pack_items(items_sorted, containers, engine, find_position, fits, stamp=False,
+               used_space=None, container_index=None, skip_preferred=False, deadline=None,
+               reasons=None, placed=None, rearrange=False, steps=None, cascade=True):
+    # The placement loop of place_items_with_nn without the reporting.
+    # Returns the (item, containerId, box) placed, in order, and the items
+    # left over. With skip_preferred, an item's own zone is not tried again;
+    # past `deadline` (a time.time() value) the remaining items are left.
+    # `reasons` gets why each item was left (see UNPLACED_REASONS), and a
+    # `placed` list passed in fills up as items are placed, so another
+    # thread can read the progress. With rearrange, items that fit nowhere
+    # get a RearrangementPlanner attempt after the main pass and its moves go
+    # into `steps`. Plans only ever add items to the finished packing, so
+    # they cannot cost a placement the main pass made. cascade=False sends
+    # every pair to `fits` (see fit_matrix).
+    if used_space is None:
+        used_space = {c['containerId']: placement_backends.new_used_space(engine, c) for c in containers}
+    if container_index is None:
+        container_index = ContainerIndex(
+            containers, learn_failures=engine in placement_backends.MONOTONE_SEARCH
+        )
+    containers_by_id = {c['containerId']: c for c in containers}
+    smallest_left = smallest_volume_left(items_sorted)
+    stamped = set()
+    memo = ShapeMemo()
+    fit_matrix = FitMatrix(items_sorted, containers, fits, cascade=cascade)
+    placed = [] if placed is None else placed
+    unplaced = []
+    reasons = {} if reasons is None else reasons
+    planner = None
+    if rearrange and engine in placement_backends.MONOTONE_SEARCH:
+        planner = RearrangementPlanner(containers, used_space, container_index, find_position, memo)
+        if steps is not None:
+            planner.steps = steps
+    # Index of each item's entry in `placed`, to update it when it is moved
+    entry_of = {}
+
+    def accept(item, cid, box):
+        used_space[cid].append(box)
+        memo.changed(cid)
+        container_index.record(cid, box, used_space[cid])
+        entry_of[item['itemId']] = len(placed)
+        placed.append((item, cid, box))
+        if planner is not None:
+            planner.record(cid, item, box)
+
+    for i, item in enumerate(items_sorted):
+        if item['itemId'] in stamped:
+            continue
+        out_of_time = deadline is not None and time.time() >= deadline
+        if out_of_time or container_index.max_remaining() < smallest_left[i]:
+            for other in items_sorted[i:]:
+                if other['itemId'] not in stamped:
+                    unplaced.append(other)
+                    reasons[other['itemId']] = "deadline" if out_of_time else "containers_full"
+            break
+        reason = "no_container"
+        box = None
+        for cid in container_index.candidates(item, skip_preferred):
+            container = containers_by_id[cid]
+            if not fit_matrix.fits(item, container):
+                if reason == "no_container":
+                    reason = "model_rejected"
+                continue
+            box = memo.find(find_position, container, used_space[container['containerId']], item)
+            if box:
+                break
+            container_index.record_failure(container['containerId'], item)
+            reason = "no_space"
+
+        if not box:
+            unplaced.append(item)
+            reasons[item['itemId']] = reason
+            continue
+
+        cid = container['containerId']
+        accept(item, cid, box)
+        if stamp:
+            stamped.add(item['itemId'])
+            # Only the copies the fit matrix accepts for this container too
+            copies = list(takewhile(lambda other: fit_matrix.fits(other, container), identical_run(items_sorted, i)))
+            for copy, copy_box in zip(copies, stamp_copies(container, used_space[cid], box, len(copies))):
+                accept(copy, cid, copy_box)
+                stamped.add(copy['itemId'])
+
+    if planner is not None:
+        for item in [other for other in unplaced if reasons[other['itemId']] in ("no_container", "no_space")]:
+            if deadline is not None and time.time() >= deadline:
+                break
+            plan = planner.plan(item, allowed=lambda c: fit_matrix.fits(item, c))
+            if not plan:
+                continue
+            cid, box, moves = plan
+            for moved, _, _, to_cid, to_box in moves:
+                placed[entry_of[moved['itemId']]] = (moved, to_cid, to_box)
+            accept(item, cid, box)
+            unplaced.remove(item)
+            del reasons[item['itemId']]
+
+    return placed, unplaced, used_space
+
+
+# Set once per worker, so the model is not pickled again for every zone
+_worker_fits = None
+
+
+def _init_worker(fits):
+    global _worker_fits
+    _worker_fits = fits
+
+
+def _pack_zone(args):
+    items_sorted, containers, engine, find_position, stamp, deadline = args
+    placed, unplaced, _ = pack_items(
+        items_sorted, containers, engine, find_position, _worker_fits, stamp, deadline=deadline
+    )
+    # Only ids and boxes travel back; the parent rebuilds the structures
+    return [(item['itemId'], cid, box) for item, cid, box in placed], [item['itemId'] for item in unplaced]
+
+
+def place_by_zone(items, containers, engine, find_position, fits, stamp=False, workers=None,
+                  deadline=None, reasons=None):
+    # Returns the (item, containerId, box) placed, every zone's own items in
+    # container-zone order and then the overflow pass, and the used_space
+    # structures holding them. `deadline` holds for the workers and the
+    # overflow pass alike; items a worker had no time for reach the overflow
+    # pass after the deadline too, so `reasons` gets "deadline" for them.
+    items_sorted = sorted(items, key=placement_backends.placement_order(engine))
+    zones = list(dict.fromkeys(c['zone'] for c in containers))
+    tasks = [
+        (
+            [item for item in items_sorted if item['preferredZone'] == zone],
+            [c for c in containers if c['zone'] == zone],
+            engine, find_position, stamp, deadline,
+        )
+        for zone in zones
+    ]
+    workers = min(workers or os.cpu_count() or 1, len(tasks)) or 1
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(fits,)) as pool:
+        results = list(pool.map(_pack_zone, tasks))
+
+    items_by_id = {item['itemId']: item for item in items_sorted}
+    used_space = {c['containerId']: placement_backends.new_used_space(engine, c) for c in containers}
+    container_index = ContainerIndex(
+        containers, learn_failures=engine in placement_backends.MONOTONE_SEARCH
+    )
+    placed = []
+    overflow_ids = set()
+    for zone_placed, zone_unplaced in results:
+        for item_id, cid, box in zone_placed:
+            used_space[cid].append(box)
+            container_index.record(cid, box, used_space[cid])
+            placed.append((items_by_id[item_id], cid, box))
+        overflow_ids.update(zone_unplaced)
+
+    # Items whose zone has no containers never went to a worker
+    overflow_ids.update(item['itemId'] for item in items_sorted if item['preferredZone'] not in zones)
+    overflow = [item for item in items_sorted if item['itemId'] in overflow_ids]
+    overflow_placed, _, _ = pack_items(
+        overflow, containers, engine, find_position, fits, stamp,
+        used_space=used_space, container_index=container_index, skip_preferred=True,
+        deadline=deadline, reasons=reasons,
+    )
+    return placed + overflow_placed, used_space